@@ -0,0 +1,269 @@
+#!/usr/bin/python
+"""
+Benchmark:
+---------
+
+Times the pipeline stages separately against a synthetic UIS bulk zip,
+reporting rows/s, peak RSS and bytes written, and compares the results with a
+saved baseline.
+
+"""
+
+import argparse
+import logging
+import platform
+import socket
+import sys
+from os import makedirs
+from os.path import join
+from resource import RUSAGE_SELF, getrusage
+from shutil import copyfile
+from time import perf_counter
+
+from benchmarks.synthetic import generate_bulk_zip, get_countries
+
+from hdx.api.configuration import Configuration
+from hdx.scraper.unesco.metrics import get_folder_size
+from hdx.scraper.unesco.offline import setup_offline
+from hdx.scraper.unesco.pipeline import (
+    download_indicatorsets,
+    generate_dataset_and_showcase,
+    get_countriesdata,
+    partition_datafiles,
+)
+from hdx.utilities.loader import load_json
+from hdx.utilities.path import script_dir_plus_file, temp_dir
+from hdx.utilities.saver import save_json
+
+logger = logging.getLogger(__name__)
+
+
+def disable_network():
+    """Fails anything that tries to connect so that the benchmark stays
+    independent of the network"""
+
+    def connect(self, address):
+        raise OSError(f"Benchmark tried to connect to {address}!")
+
+    socket.socket.connect = connect
+
+
+def reset_peak_rss():
+    """Resets the peak RSS of the process so that it can be read for each
+    stage, which only Linux allows, returning whether it was reset"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        return False
+    return True
+
+
+def get_peak_rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return round(int(line.split()[1]) / 1024, 1)
+    return None
+
+
+def setup_offline_configuration():
+    Configuration._create(
+        hdx_read_only=True,
+        user_agent="benchmark",
+        project_config_yaml=script_dir_plus_file(
+            join("config", "project_configuration.yaml"), generate_dataset_and_showcase
+        ),
+    )
+    setup_offline()
+
+
+class Stage:
+    def __init__(self, name, results, folder):
+        self.name = name
+        self.results = results
+        self.folder = folder
+        self.rows = None
+
+    def __enter__(self):
+        self.size = get_folder_size(self.folder)
+        self.reset = reset_peak_rss()
+        self.maxrss = getrusage(RUSAGE_SELF).ru_maxrss
+        self.start = perf_counter()
+        return self
+
+    def get_peak_rss_mb(self):
+        if self.reset:
+            return get_peak_rss_mb()
+        # the peak of the whole run so far is only the stage's peak if the
+        # stage raised it
+        maxrss = getrusage(RUSAGE_SELF).ru_maxrss
+        if maxrss == self.maxrss:
+            return None
+        # ru_maxrss is in kilobytes on Linux
+        return round(maxrss / 1024, 1)
+
+    def __exit__(self, *args):
+        seconds = perf_counter() - self.start
+        result = {
+            "seconds": round(seconds, 3),
+            "bytes_written": get_folder_size(self.folder) - self.size,
+            "peak_rss_mb": self.get_peak_rss_mb(),
+        }
+        if self.rows is not None:
+            result["rows"] = self.rows
+            result["rows_per_second"] = round(self.rows / seconds)
+        self.results[self.name] = result
+        logger.info(f"{self.name}: {result}")
+
+
+def run_benchmark(folder, shape, sample=5, indicatorsetcode="SDG"):
+    indicatorsetcodes = Configuration.read()["indicatorsetcodes"]
+    indicatorsetcodes = {indicatorsetcode: indicatorsetcodes[indicatorsetcode]}
+    quickcharts = indicatorsetcodes[indicatorsetcode].get("quickcharts", ())
+    sourcefolder = join(folder, "source")
+    outputfolder = join(folder, "output")
+    zippath = join(sourcefolder, f"{indicatorsetcode}.zip")
+    makedirs(sourcefolder)
+    makedirs(outputfolder)
+    counts = generate_bulk_zip(
+        zippath,
+        indicatorsetcode,
+        extra_indicators=[x["code"] for x in quickcharts],
+        **shape,
+    )
+
+    def copy_urlretrieve(url, path):
+        class Headers:
+            @staticmethod
+            def get_content_type():
+                return "application/zip"
+
+        copyfile(zippath, path)
+        return path, Headers()
+
+    stages = dict()
+    with Stage("download_indicatorsets", stages, outputfolder):
+        indicatorsets = download_indicatorsets(
+            "https://example.org/",
+            outputfolder,
+            indicatorsetcodes,
+            urlretrieve=copy_urlretrieve,
+        )
+    with Stage("get_countriesdata", stages, outputfolder) as stage:
+        (
+            countries,
+            indheaders,
+            indicatorsetsindicators,
+            indicatorsetsdates,
+            datafiles,
+            _,
+        ) = get_countriesdata(indicatorsets, outputfolder)
+        stage.rows = counts["rows"]
+    with Stage("partition_datafiles", stages, outputfolder) as stage:
+        countriesdatafiles = partition_datafiles(datafiles, indicatorsetcodes)
+        stage.rows = counts["rows"]
+    step = max(len(countries) // sample, 1)
+    countries = countries[::step][:sample]
+    with Stage("generate_dataset_and_showcase", stages, outputfolder) as stage:
+        for country in countries:
+            generate_dataset_and_showcase(
+                indicatorsetcodes,
+                indheaders,
+                indicatorsetsindicators,
+                indicatorsetsdates,
+                country,
+                countriesdatafiles.get(country["iso3"], dict()),
+                outputfolder,
+            )
+        stage.rows = sum(counts["countryrows"][x["iso3"]] for x in countries)
+    return {
+        "shape": shape,
+        "sample": len(countries),
+        "python": platform.python_version(),
+        "stages": stages,
+    }
+
+
+def compare_results(results, baseline, tolerance):
+    regressions = list()
+    for name, result in results["stages"].items():
+        baselineresult = baseline["stages"].get(name)
+        if baselineresult is None:
+            continue
+        ratio = result["seconds"] / max(baselineresult["seconds"], 0.001)
+        logger.info(
+            f"{name}: {result['seconds']}s against {baselineresult['seconds']}s ({ratio:.2f}x)"
+        )
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+    return regressions
+
+
+def main(
+    countries=250,
+    indicators=4000,
+    years=50,
+    density=0.5,
+    sample=5,
+    output=None,
+    baseline=None,
+    tolerance=0.2,
+):
+    disable_network()
+    setup_offline_configuration()
+    shape = {
+        "countries": min(countries, len(get_countries(countries))),
+        "indicators": indicators,
+        "years": years,
+        "density": density,
+    }
+    with temp_dir("UNESCOBenchmark", delete_on_success=True) as folder:
+        results = run_benchmark(folder, shape, sample)
+    if output:
+        save_json(results, output)
+    if baseline:
+        baseline = load_json(baseline)
+        if baseline["shape"] != results["shape"]:
+            logger.warning("Baseline was run with a different shape!")
+        regressions = compare_results(results, baseline, tolerance)
+        if regressions:
+            logger.error(f"Slower than baseline: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="UNESCO pipeline benchmark")
+    parser.add_argument("-c", "--countries", default=250, type=int)
+    parser.add_argument("-i", "--indicators", default=4000, type=int)
+    parser.add_argument("-y", "--years", default=50, type=int)
+    parser.add_argument("-d", "--density", default=0.5, type=float)
+    parser.add_argument(
+        "-s", "--sample", default=5, type=int, help="Countries to generate"
+    )
+    parser.add_argument("-o", "--output", default=None, help="Results json to write")
+    parser.add_argument(
+        "-b", "--baseline", default=None, help="Results json to compare against"
+    )
+    parser.add_argument(
+        "-t",
+        "--tolerance",
+        default=0.2,
+        type=float,
+        help="Allowed slow down relative to the baseline",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(
+        main(
+            args.countries,
+            args.indicators,
+            args.years,
+            args.density,
+            args.sample,
+            args.output,
+            args.baseline,
+            args.tolerance,
+        )
+    )
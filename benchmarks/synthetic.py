@@ -0,0 +1,130 @@
+#!/usr/bin/python
+"""
+Synthetic:
+---------
+
+Generates UIS bulk zips of a configurable shape with the same members and
+layout as the real ones (DATA_NATIONAL, METADATA, LABEL, COUNTRY and README)
+so that the pipeline can be measured at full scale.
+
+"""
+
+import argparse
+import logging
+from datetime import date
+from os.path import join
+from random import Random
+from zipfile import ZIP_DEFLATED, ZipFile
+
+from hdx.location.country import Country
+
+logger = logging.getLogger(__name__)
+
+
+def get_countries(number):
+    countriesdata = Country.countriesdata(use_live=False)
+    return sorted(countriesdata["countries"].keys())[:number]
+
+
+def get_indicators(number, extra_indicators=()):
+    indicators = list(extra_indicators)
+    for i in range(number - len(indicators)):
+        indicators.append(f"IND.{i}")
+    return sorted(indicators)
+
+
+def generate_bulk_zip(
+    path,
+    indicatorsetcode="NATMON",
+    countries=250,
+    indicators=4000,
+    years=50,
+    density=0.5,
+    metadata_every=20,
+    extra_indicators=(),
+    release=date(2020, 9, 1),
+    seed=0,
+):
+    """Writes a bulk zip in which each (indicator, country) pair has data with
+    probability density for a random run of years and returns counts of the
+    data rows in total and for each country"""
+    random = Random(seed)
+    countryisos = get_countries(countries)
+    indicatorids = get_indicators(indicators, extra_indicators)
+    firstyear = release.year - years
+    rows = 0
+    countryrows = {countryiso: 0 for countryiso in countryisos}
+    with ZipFile(path, "w", ZIP_DEFLATED) as zipfile:
+        with zipfile.open(f"{indicatorsetcode}_LABEL.csv", "w") as fp:
+            fp.write(b"INDICATOR_ID,INDICATOR_LABEL_EN\n")
+            for indicatorid in indicatorids:
+                label = f"Synthetic indicator {indicatorid}, both sexes (number)"
+                fp.write(f'{indicatorid},"{label}"\n'.encode("cp1252"))
+        with zipfile.open(f"{indicatorsetcode}_COUNTRY.csv", "w") as fp:
+            fp.write(b"COUNTRY_ID,COUNTRY_NAME_EN\r\n")
+            for countryiso in countryisos:
+                countryname = Country.get_country_name_from_iso3(countryiso)
+                fp.write(f'{countryiso},"{countryname}"\r\n'.encode("utf-8"))
+        # zipfile allows only one member open for writing so metadata, which
+        # is much smaller, is written after the data
+        metadatalines = list()
+        datafile = f"{indicatorsetcode}_DATA_NATIONAL.csv"
+        with zipfile.open(datafile, "w", force_zip64=True) as fp:
+            fp.write(b"INDICATOR_ID,COUNTRY_ID,YEAR,VALUE,MAGNITUDE,QUALIFIER\r\n")
+            for indicatorid in indicatorids:
+                for countryiso in countryisos:
+                    if random.random() >= density:
+                        continue
+                    start = random.randrange(years)
+                    end = random.randrange(start, years) + 1
+                    lines = list()
+                    for year in range(firstyear + start, firstyear + end):
+                        if random.random() < 0.05:
+                            value = random.randrange(100)
+                            lines.append(
+                                f"{indicatorid},{countryiso},{year},{value},NA,\r\n"
+                            )
+                        else:
+                            value = round(random.uniform(0, 100), 5)
+                            lines.append(
+                                f"{indicatorid},{countryiso},{year},{value},,\r\n"
+                            )
+                    fp.write("".join(lines).encode("utf-8"))
+                    rows += len(lines)
+                    countryrows[countryiso] += len(lines)
+                    if random.randrange(metadata_every) == 0:
+                        metadatalines.append(
+                            f'{indicatorid},{countryiso},{year},Source:Data sources,"{countryiso} survey {year}, national coverage."\r\n'
+                        )
+        with zipfile.open(f"{indicatorsetcode}_METADATA.csv", "w") as fp:
+            fp.write(b"INDICATOR_ID,COUNTRY_ID,YEAR,TYPE,METADATA\r\n")
+            fp.write("".join(metadatalines).encode("utf-8"))
+        readme = f"{indicatorsetcode}_README_RELEASE_{release.year}_{release:%B}.md"
+        with zipfile.open(readme, "w") as fp:
+            fp.write(
+                f"Dataset: Synthetic {indicatorsetcode}\r\nRelease date: {release:%B %Y}\r\n".encode(
+                    "utf-8"
+                )
+            )
+    logger.info(f"Generated {path} with {rows} data rows")
+    return {"rows": rows, "countryrows": countryrows}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Synthetic UIS bulk zip")
+    parser.add_argument("folder", help="Folder in which to write the zip")
+    parser.add_argument("-s", "--indicatorsetcode", default="NATMON")
+    parser.add_argument("-c", "--countries", default=250, type=int)
+    parser.add_argument("-i", "--indicators", default=4000, type=int)
+    parser.add_argument("-y", "--years", default=50, type=int)
+    parser.add_argument("-d", "--density", default=0.5, type=float)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    generate_bulk_zip(
+        join(args.folder, f"{args.indicatorsetcode}.zip"),
+        args.indicatorsetcode,
+        args.countries,
+        args.indicators,
+        args.years,
+        args.density,
+    )
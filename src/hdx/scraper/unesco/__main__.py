@@ -7,104 +7,412 @@ Top level script. Calls other functions that generate datasets that this script
 import argparse
 import logging
 import sys
-from os import getenv
-from os.path import expanduser, join
+from os import getenv, remove
+from os.path import exists, expanduser, join
+from threading import Lock
 
 from hdx.api.configuration import Configuration
 from hdx.data.user import User
 from hdx.facades.keyword_arguments import facade
 from hdx.scraper.unesco._version import __version__
+from hdx.scraper.unesco.manifest import (
+    get_country_hashes,
+    load_manifest,
+    save_manifest,
+)
+from hdx.scraper.unesco.metrics import Metrics, measure, save_metrics
+from hdx.scraper.unesco.offline import save_offline, setup_offline
 from hdx.scraper.unesco.pipeline import (
     download_indicatorsets,
-    generate_dataset_and_showcase,
     get_countriesdata,
+    organisation,
+    partition_datafiles,
+)
+from hdx.scraper.unesco.profiler import Profiler
+from hdx.scraper.unesco.releases import get_pair_digests, is_unchanged
+from hdx.scraper.unesco.scheduler import Scheduler
+from hdx.scraper.unesco.shards import (
+    get_shard_batch,
+    get_shard_countries,
+    parse_shard,
+)
+from hdx.scraper.unesco.snapshot import Snapshot
+from hdx.scraper.unesco.workers import (
+    UploadQueue,
+    generate_payload,
+    get_executor,
+    load_payload,
+    submit_countries,
 )
-from hdx.utilities.downloader import Download
 from hdx.utilities.path import (
     progress_storing_folder,
     script_dir_plus_file,
     wheretostart_tempdir_batch,
 )
+from hdx.utilities.saver import save_text
 
 logger = logging.getLogger(__name__)
 
 lookup = "hdx-scraper-unesco"
 
 
-def main(base_url=None, test=False, **ignore):
-    """Generate dataset and create it in HDX"""
+def create_in_hdx(
+    dataset,
+    showcase,
+    bites_disabled,
+    qc_indicators,
+    batch,
+    hashes,
+    published,
+    snapshot,
+):
+    """published are the hashes from when the country was last created in HDX.
+    The default views, QuickCharts view and showcase and its link to the
+    dataset are only created if they could have changed since then. The
+    existing dataset and showcase are taken from snapshot."""
+    snapshot.use(dataset)
+    snapshot.use(showcase)
+    resources_changed = hashes["resources"] != published.get("resources")
+    if resources_changed or hashes["quickcharts"] != published.get("quickcharts"):
+        dataset.generate_quickcharts(
+            -1, bites_disabled=bites_disabled, indicators=qc_indicators
+        )
+    dataset.create_in_hdx(
+        match_resources_by_metadata=False,
+        remove_additional_resources=True,
+        match_resource_order=True,
+        create_default_views=resources_changed,
+        hxl_update=False,
+        updated_by_script="HDX Scraper: UNESCO",
+        batch=batch,
+    )
+    if hashes["showcase"] == published.get("showcase"):
+        logger.info(f"Showcase {showcase['name']} is already linked")
+        return
+    showcase.create_in_hdx()
+    showcase.add_dataset(dataset)
+
+
+def remove_resource_files(dataset):
+    for resource in dataset.get_resources():
+        path = resource.get_file_to_upload()
+        if path and exists(path):
+            remove(path)
+
+
+def main(
+    base_url=None,
+    test=False,
+    cache_folder=None,
+    force=False,
+    workers=1,
+    uploaders=0,
+    metrics_folder=None,
+    low_disk=False,
+    offline_folder=None,
+    shard=None,
+    batch=None,
+    run_id=None,
+    api_rate=10,
+    profile_folder=None,
+    profile_countries=False,
+    **ignore,
+):
+    """Generate dataset and create it in HDX or, if offline_folder is given,
+    save it to that folder"""
 
     logger.info(f"##### {lookup} version {__version__} ####")
     if base_url is None:
         raise ValueError("Must supply base_url ")
-    if not User.check_current_user_organization_access(
-        "18f2d467-dcf8-4b7e-bffa-b3c338ba3a7c", "create_dataset"
+    if shard:
+        shard = parse_shard(shard)
+        if batch is None:
+            batch = get_shard_batch(lookup, shard[1], run_id)
+    configuration = Configuration.read()
+    if profile_folder:
+        profiler = Profiler(profile_folder, countries=profile_countries)
+    else:
+        profiler = None
+    metrics = Metrics(profiler)
+    metrics.count_api_calls(configuration)
+    # shared by the upload threads. Starts with one request in flight and
+    # grows up to one per uploader while HDX keeps up.
+    scheduler = Scheduler(
+        rate=api_rate, concurrency=1, max_concurrency=max(uploaders, 1)
+    )
+    scheduler.schedule(configuration)
+    try:
+        run(
+            base_url,
+            test,
+            cache_folder,
+            force,
+            workers,
+            uploaders,
+            metrics,
+            low_disk,
+            offline_folder,
+            shard,
+            batch,
+        )
+    finally:
+        logger.info(
+            f"Retried {scheduler.retried} HDX requests, {scheduler.throttled} of them throttled"
+        )
+        logger.info(f"Peak disk usage: {metrics.peakdisk / 1048576:.1f} MB")
+        save_metrics(metrics, metrics_folder)
+
+
+def run(
+    base_url,
+    test,
+    cache_folder,
+    force,
+    workers,
+    uploaders,
+    metrics,
+    low_disk,
+    offline_folder,
+    shard,
+    batch,
+):
+    if offline_folder:
+        logger.info(f"Saving datasets to {offline_folder} instead of HDX")
+        setup_offline()
+    elif not User.check_current_user_organization_access(
+        organisation, "create_dataset"
     ):
         raise PermissionError("API Token does not give access to UNESCO organisation!")
     logger.info(f"Using UNESCO url {base_url}")
-    with Download() as downloader:
-        with wheretostart_tempdir_batch(lookup) as info:
-            folder = info["folder"]
-            batch = info["batch"]
-            indicatorsetcodes = Configuration.read()["indicatorsetcodes"]
-            if test:
-                newindicatorsetcodes = dict()
-                for key in indicatorsetcodes:
-                    if key == "NATMON":
-                        newindicatorsetcodes[key] = indicatorsetcodes[key]
-                        break
-                indicatorsetcodes = newindicatorsetcodes
-            indicatorsets = download_indicatorsets(base_url, folder, indicatorsetcodes)
-            logger.info(f"Number of indicator types to upload: {len(indicatorsets)}")
+    if shard:
+        # shards running on the same machine keep separate progress
+        shardname = f"{shard[0]}of{shard[1]}"
+        tempfolder = f"{lookup}-{shardname}"
+    else:
+        shardname = None
+        tempfolder = lookup
+    with wheretostart_tempdir_batch(tempfolder, batch=batch) as info:
+        folder = info["folder"]
+        batch = info["batch"]
+        indicatorsetcodes = Configuration.read()["indicatorsetcodes"]
+        if test:
+            newindicatorsetcodes = dict()
+            for key in indicatorsetcodes:
+                if key == "NATMON":
+                    newindicatorsetcodes[key] = indicatorsetcodes[key]
+                    break
+            indicatorsetcodes = newindicatorsetcodes
+        with measure(metrics, "download_indicatorsets"):
+            indicatorsets = download_indicatorsets(
+                base_url,
+                folder,
+                indicatorsetcodes,
+                cachefolder=cache_folder,
+                metrics=metrics,
+                revalidate=not offline_folder,
+            )
+        metrics.sample_disk(folder)
+        logger.info(f"Number of indicator types to upload: {len(indicatorsets)}")
+        with measure(metrics, "get_countriesdata"):
             (
                 countries,
                 indheaders,
                 indicatorsetsindicators,
                 indicatorsetsdates,
                 datafiles,
-            ) = get_countriesdata(indicatorsets, downloader, folder)
-            if test:
-                countries = [
-                    {"iso3": "AFG", "iso2": "AF", "countryname": "Afghanistan"}
-                ]
-            logger.info(f"Number of countries to upload: {len(countries)}")
-            for info, country in progress_storing_folder(info, countries, "iso3"):
-                (
+                coverage,
+            ) = get_countriesdata(indicatorsets, folder, metrics, low_disk)
+        # written with the metrics as a record of the run
+        metrics.coverage = coverage
+        metrics.sample_disk(folder)
+        if test:
+            countries = [{"iso3": "AFG", "iso2": "AF", "countryname": "Afghanistan"}]
+        if shard:
+            countries = get_shard_countries(countries, datafiles, *shard)
+            logger.info(f"Using batch {info['batch']}")
+            countryisos = {country["iso3"] for country in countries}
+        else:
+            countryisos = None
+        logger.info(f"Number of countries to upload: {len(countries)}")
+        if cache_folder and not offline_folder:
+            if shardname:
+                # a shard only saves its own countries
+                manifestpath = join(cache_folder, f"manifest-{shardname}.json")
+                releasespath = join(cache_folder, f"releases-{shardname}.json")
+            else:
+                manifestpath = join(cache_folder, "manifest.json")
+                releasespath = join(cache_folder, "releases.json")
+            # kept so that resources of unchanged pairs can be reused
+            outputfolder = join(cache_folder, "resources")
+        else:
+            manifestpath = None
+            releasespath = None
+            outputfolder = folder
+        manifest = load_manifest(manifestpath)
+        releases = load_manifest(releasespath)
+        if force:
+            releases = dict()
+        with measure(metrics, "partition_datafiles"):
+            countriesdatafiles = partition_datafiles(
+                datafiles,
+                indicatorsetcodes,
+                countryisos=countryisos,
+            )
+        metrics.sample_disk(folder)
+        pairdigests = get_pair_digests(
+            indicatorsetcodes,
+            indicatorsetsindicators,
+            indicatorsetsdates,
+            countriesdatafiles,
+            __version__,
+        )
+        unchanged = {
+            country["iso3"]
+            for country in countries
+            if country["iso3"] in manifest
+            and is_unchanged(
+                releases.get(country["iso3"]), pairdigests.get(country["iso3"])
+            )
+        }
+        logger.info(f"Number of countries unchanged in release: {len(unchanged)}")
+        manifestlock = Lock()
+        snapshot = Snapshot(organisation, "unesco-data-for-*-showcase")
+
+        def save_release(countryiso, release):
+            with manifestlock:
+                releases[countryiso] = release
+                save_manifest(releases, releasespath)
+
+        def upload(
+            countryiso, dataset, showcase, bites_disabled, qc_indicators, release
+        ):
+            if offline_folder:
+                save_offline(
+                    join(offline_folder, countryiso),
+                    dataset,
+                    showcase,
+                    bites_disabled,
+                    qc_indicators,
+                )
+                if low_disk:
+                    remove_resource_files(dataset)
+                return True
+            hashes = get_country_hashes(
+                dataset, showcase, bites_disabled, qc_indicators
+            )
+            if not force and manifest.get(countryiso) == hashes:
+                logger.info(f"{countryiso} is unchanged since the last run")
+                save_release(countryiso, release)
+                if low_disk:
+                    remove_resource_files(dataset)
+                return False
+            with measure(metrics, "hdx", country=countryiso) as record:
+                api_calls = metrics.get_api_calls()
+                if force:
+                    published = dict()
+                else:
+                    published = manifest.get(countryiso, dict())
+                create_in_hdx(
                     dataset,
                     showcase,
                     bites_disabled,
                     qc_indicators,
-                ) = generate_dataset_and_showcase(
-                    indicatorsetcodes,
-                    indheaders,
-                    indicatorsetsindicators,
-                    indicatorsetsdates,
-                    country,
-                    datafiles,
-                    downloader,
-                    info["folder"],
+                    batch,
+                    hashes,
+                    published,
+                    snapshot,
                 )
-                if dataset:
-                    dataset.update_from_yaml(
-                        script_dir_plus_file(
-                            join("config", "hdx_dataset_static.yaml"), main
+                record["api_calls"] = metrics.get_api_calls() - api_calls
+            with manifestlock:
+                manifest[countryiso] = hashes
+                save_manifest(manifest, manifestpath)
+            save_release(countryiso, release)
+            if low_disk:
+                remove_resource_files(dataset)
+            return True
+
+        executor = get_executor(
+            {
+                "indicatorsetcodes": indicatorsetcodes,
+                "indheaders": indheaders,
+                "indicatorsetsindicators": indicatorsetsindicators,
+                "indicatorsetsdates": indicatorsetsdates,
+                "countriesdatafiles": countriesdatafiles,
+                "pairdigests": pairdigests,
+                "releases": releases,
+                "profiler": metrics.profiler,
+            },
+            workers,
+        )
+        if uploaders > 0 and not test:
+            uploadqueue = UploadQueue(upload, uploaders)
+        else:
+            uploadqueue = None
+        if low_disk:
+            # generate only a little ahead of the uploads so that few
+            # countries' files are on disk at once
+            limit = workers * 2
+        else:
+            limit = None
+        futures = None
+        try:
+            for info, country in progress_storing_folder(info, countries, "iso3"):
+                countryiso = country["iso3"]
+                if countryiso in unchanged:
+                    logger.info(f"{countryiso} is unchanged in the release")
+                    continue
+                if executor is None:
+                    payload = generate_payload(country, outputfolder)
+                else:
+                    if futures is None:
+                        # progress_storing_folder starts from where a previous
+                        # run stopped so submit from the first country it yields
+                        start = countries.index(country)
+                        remaining = (
+                            x for x in countries[start:] if x["iso3"] not in unchanged
                         )
+                        futures = dict()
+                    submit_countries(executor, remaining, outputfolder, futures, limit)
+                    payload = futures.pop(countryiso).result()
+                metrics.add(payload.pop("metrics"))
+                release = payload.pop("release")
+                dataset, showcase, bites_disabled, qc_indicators = load_payload(payload)
+                if not dataset:
+                    continue
+                if low_disk:
+                    metrics.sample_disk(folder, outputfolder)
+                dataset.update_from_yaml(
+                    script_dir_plus_file(
+                        join("config", "hdx_dataset_static.yaml"), main
                     )
-                    dataset.generate_quickcharts(
-                        -1, bites_disabled=bites_disabled, indicators=qc_indicators
-                    )
-                    dataset.create_in_hdx(
-                        match_resources_by_metadata=False,
-                        remove_additional_resources=True,
-                        match_resource_order=True,
-                        hxl_update=False,
-                        updated_by_script="HDX Scraper: UNESCO",
-                        batch=batch,
-                    )
-                    showcase.create_in_hdx()
-                    showcase.add_dataset(dataset)
-                    if test:
+                )
+                arguments = (
+                    dataset,
+                    showcase,
+                    bites_disabled,
+                    qc_indicators,
+                    release,
+                )
+                if uploadqueue is None:
+                    uploaded = upload(countryiso, *arguments)
+                    if uploaded and test:
                         sys.exit(0)
+                elif not uploadqueue.put(countryiso, *arguments):
+                    break
+        finally:
+            metrics.sample_disk(folder, outputfolder)
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+            if uploadqueue is not None:
+                try:
+                    uploadqueue.close()
+                finally:
+                    if uploadqueue.pending:
+                        # resume from the earliest country not uploaded
+                        save_text(
+                            f"iso3={uploadqueue.pending[0]}",
+                            join(info["folder"], "progress.txt"),
+                        )
 
 
 if __name__ == "__main__":
@@ -113,7 +421,110 @@ if __name__ == "__main__":
     parser.add_argument(
         "-t", "--test", default=False, action="store_true", help="Generate test data"
     )
+    parser.add_argument(
+        "-f",
+        "--force",
+        default=False,
+        action="store_true",
+        help="Update countries even if unchanged since the last run",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        default=1,
+        type=int,
+        help="Number of processes with which to generate country datasets",
+    )
+    parser.add_argument(
+        "-u",
+        "--uploaders",
+        default=0,
+        type=int,
+        help="Number of threads uploading to HDX while generation continues",
+    )
+    parser.add_argument(
+        "-mf",
+        "--metrics_folder",
+        default=None,
+        help="Folder in which to write run metrics as JSON and a Prometheus textfile",
+    )
+    parser.add_argument(
+        "-ld",
+        "--low_disk",
+        default=False,
+        action="store_true",
+        help="Keep intermediates compressed and delete each country's files once uploaded",
+    )
+    parser.add_argument(
+        "-of",
+        "--offline_folder",
+        default=None,
+        help="Folder in which to save datasets, showcases and resources without HDX",
+    )
+    parser.add_argument(
+        "-s",
+        "--shard",
+        default=None,
+        help="Only process shard i of N (given as i/N) of the countries",
+    )
+    parser.add_argument(
+        "-b",
+        "--batch",
+        default=None,
+        help="HDX batch id, which should be the same for all shards",
+    )
+    parser.add_argument(
+        "-ri",
+        "--run_id",
+        default=None,
+        help="Id shared by all shards from which to derive the batch id if none is given",
+    )
+    parser.add_argument(
+        "-ar",
+        "--api_rate",
+        default=None,
+        type=float,
+        help="Maximum HDX API requests per second",
+    )
+    parser.add_argument(
+        "-p",
+        "--profile",
+        default=None,
+        help="Folder in which to write cProfile stats and memory allocations of each stage",
+    )
+    parser.add_argument(
+        "-pc",
+        "--profile_countries",
+        default=False,
+        action="store_true",
+        help="Also profile generating and uploading each country",
+    )
+    parser.add_argument(
+        "-cf",
+        "--cache_folder",
+        default=None,
+        help="Folder in which to cache downloads between runs",
+    )
     args = parser.parse_args()
+    cache_folder = args.cache_folder
+    if cache_folder is None:
+        cache_folder = getenv("CACHE_FOLDER")
+    metrics_folder = args.metrics_folder
+    if metrics_folder is None:
+        metrics_folder = getenv("METRICS_FOLDER")
+    shard = args.shard
+    if shard is None:
+        shard = getenv("SHARD")
+    batch = args.batch
+    if batch is None:
+        batch = getenv("BATCH")
+    run_id = args.run_id
+    if run_id is None:
+        # shared by all of a GitHub Actions workflow run's jobs and reruns
+        run_id = getenv("RUN_ID", getenv("GITHUB_RUN_ID"))
+    api_rate = args.api_rate
+    if api_rate is None:
+        api_rate = float(getenv("API_RATE", 10))
     base_url = args.base_url
     if base_url is None:
         base_url = getenv("BASE_URL")
@@ -123,6 +534,7 @@ if __name__ == "__main__":
             )
     facade(
         main,
+        hdx_read_only=args.offline_folder is not None,
         user_agent_config_yaml=join(expanduser("~"), ".useragents.yaml"),
         user_agent_lookup=lookup,
         project_config_yaml=script_dir_plus_file(
@@ -130,4 +542,17 @@ if __name__ == "__main__":
         ),
         base_url=base_url,
         test=args.test,
+        cache_folder=cache_folder,
+        force=args.force,
+        workers=args.workers,
+        uploaders=args.uploaders,
+        metrics_folder=metrics_folder,
+        low_disk=args.low_disk,
+        offline_folder=args.offline_folder,
+        shard=shard,
+        batch=batch,
+        run_id=run_id,
+        api_rate=api_rate,
+        profile_folder=args.profile,
+        profile_countries=args.profile_countries,
     )
@@ -0,0 +1,227 @@
+#!/usr/bin/python
+"""
+Download:
+--------
+
+Resumable downloading of UNESCO bulk files.
+
+"""
+
+import logging
+from contextlib import contextmanager
+from email.message import Message
+from fcntl import LOCK_EX, LOCK_UN, flock
+from hashlib import sha256
+from http.client import HTTPException
+from os import link, listdir, makedirs, remove, rename, replace
+from os.path import exists, getsize, join
+from shutil import copyfile, copyfileobj
+from urllib.error import ContentTooShortError, HTTPError
+from urllib.request import Request, urlopen
+
+from hdx.utilities.loader import load_json
+from hdx.utilities.saver import save_json
+
+logger = logging.getLogger(__name__)
+
+chunksize = 1024 * 1024
+
+
+def get_sha256(path):
+    digest = sha256()
+    with open(path, "rb") as fp:
+        for chunk in iter(lambda: fp.read(chunksize), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_total_size(response):
+    contentrange = response.headers.get("Content-Range")
+    if contentrange:
+        _, _, total = contentrange.rpartition("/")
+        if total != "*":
+            return int(total)
+        return None
+    contentlength = response.headers.get("Content-Length")
+    if contentlength is None:
+        return None
+    return int(contentlength)
+
+
+def get_validator(headers):
+    """Strong ETag or else Last-Modified with which a partial download can be
+    resumed with If-Range"""
+    etag = headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return headers.get("Last-Modified")
+
+
+def fetch(url, partpath, timeout):
+    validatorpath = f"{partpath}.json"
+    validator = None
+    if exists(partpath) and exists(validatorpath):
+        validator = load_json(validatorpath).get("validator")
+    if validator:
+        offset = getsize(partpath)
+    else:
+        # without a validator the partial file may be from an older version
+        offset = 0
+    request = Request(url)
+    if offset:
+        request.add_header("Range", f"bytes={offset}-")
+        # the whole file is sent instead if it has changed
+        request.add_header("If-Range", validator)
+    try:
+        response = urlopen(request, timeout=timeout)
+    except HTTPError as e:
+        if e.code != 416:
+            raise
+        # partial file is not a prefix of what the server has now
+        remove(partpath)
+        raise ContentTooShortError(f"Range rejected for {url}!", None)
+    with response:
+        if response.status == 206:
+            mode = "ab"
+            logger.info(f"Resuming download of {url} from byte {offset}")
+        else:
+            mode = "wb"
+            save_json({"validator": get_validator(response.headers)}, validatorpath)
+        total = get_total_size(response)
+        with open(partpath, mode) as fp:
+            copyfileobj(response, fp, chunksize)
+        headers = response.headers
+    size = getsize(partpath)
+    if total is not None and size != total:
+        raise ContentTooShortError(
+            f"Only retrieved {size} out of {total} bytes of {url}!", None
+        )
+    return headers
+
+
+def urlretrieve(url, filename, retries=5, timeout=60):
+    """Drop in replacement for urllib.request.urlretrieve that keeps partial
+    downloads in a .part file and resumes them with Range requests"""
+    partpath = f"{filename}.part"
+    validatorpath = f"{partpath}.json"
+    for attempt in range(retries + 1):
+        try:
+            headers = fetch(url, partpath, timeout)
+            break
+        except (HTTPException, OSError) as e:
+            if attempt == retries:
+                raise
+            if isinstance(e, HTTPError) and e.code < 500:
+                raise
+            logger.warning(f"Download of {url} interrupted: {e}. Retrying.")
+    rename(partpath, filename)
+    if exists(validatorpath):
+        remove(validatorpath)
+    return filename, headers
+
+
+def link_or_copy(src, dst):
+    if exists(dst):
+        remove(dst)
+    try:
+        link(src, dst)
+    except OSError:
+        copyfile(src, dst)
+
+
+def is_modified(url, entry, timeout=60):
+    request = Request(url, method="HEAD")
+    etag = entry.get("etag")
+    if etag:
+        request.add_header("If-None-Match", etag)
+    lastmodified = entry.get("last_modified")
+    if lastmodified:
+        request.add_header("If-Modified-Since", lastmodified)
+    try:
+        with urlopen(request, timeout=timeout) as response:
+            headers = response.headers
+    except HTTPError as e:
+        if e.code == 304:
+            return False
+        raise
+    if etag and headers.get("ETag") == etag:
+        return False
+    if lastmodified and headers.get("Last-Modified") == lastmodified:
+        return False
+    return True
+
+
+def is_referenced(cachefolder, digest):
+    """Whether any url's cache entry refers to the blob with the digest"""
+    for filename in listdir(cachefolder):
+        # entries are named by the sha256 of their url unlike the manifests
+        # that may share the folder
+        if len(filename) != 69 or not filename.endswith(".json"):
+            continue
+        if load_json(join(cachefolder, filename)).get("sha256") == digest:
+            return True
+    return False
+
+
+@contextmanager
+def locked(path):
+    """Holds an exclusive lock on path, which is created if needed, against
+    other threads and processes"""
+    with open(path, "a") as fp:
+        flock(fp, LOCK_EX)
+        try:
+            yield
+        finally:
+            flock(fp, LOCK_UN)
+
+
+def cached_urlretrieve(
+    url, filename, cachefolder, urlretrieve=urlretrieve, revalidate=True
+):
+    """urlretrieve that keeps downloads in a persistent content addressed
+    cache, revalidating them with ETag and Last-Modified unless revalidate is
+    False. The cache can be shared by processes such as shards on one host."""
+    makedirs(cachefolder, exist_ok=True)
+    urlkey = sha256(url.encode("utf-8")).hexdigest()
+    # only one process downloads a url and writes its part file at a time
+    with locked(join(cachefolder, f"{urlkey}.lock")):
+        return retrieve_url(url, filename, cachefolder, urlkey, urlretrieve, revalidate)
+
+
+def retrieve_url(url, filename, cachefolder, urlkey, urlretrieve, revalidate):
+    entrypath = join(cachefolder, f"{urlkey}.json")
+    entry = None
+    if exists(entrypath):
+        entry = load_json(entrypath)
+        blobpath = join(cachefolder, f"{entry['sha256']}.zip")
+        if exists(blobpath) and getsize(blobpath) == entry["size"]:
+            if not revalidate or not is_modified(url, entry):
+                logger.info(f"Using cached {url}")
+                link_or_copy(blobpath, filename)
+                headers = Message()
+                headers["Content-Type"] = entry["content_type"]
+                return filename, headers
+    downloadpath = join(cachefolder, f"{urlkey}.download")
+    _, headers = urlretrieve(url, downloadpath)
+    newentry = {
+        "url": url,
+        "etag": headers.get("ETag"),
+        "last_modified": headers.get("Last-Modified"),
+        "content_type": headers.get_content_type(),
+        "size": getsize(downloadpath),
+        "sha256": get_sha256(downloadpath),
+    }
+    blobpath = join(cachefolder, f"{newentry['sha256']}.zip")
+    # urls with the same content share a blob so it must not be removed
+    # between being renamed into place and its entry being written
+    with locked(join(cachefolder, "blobs.lock")):
+        rename(downloadpath, blobpath)
+        # written then renamed so that entries are never read half written
+        save_json(newentry, f"{entrypath}.tmp")
+        replace(f"{entrypath}.tmp", entrypath)
+        if entry and entry["sha256"] != newentry["sha256"]:
+            oldblobpath = join(cachefolder, f"{entry['sha256']}.zip")
+            if exists(oldblobpath) and not is_referenced(cachefolder, entry["sha256"]):
+                remove(oldblobpath)
+        link_or_copy(blobpath, filename)
+    return filename, headers
@@ -0,0 +1,215 @@
+#!/usr/bin/python
+"""
+Index:
+-----
+
+Byte offset index over extracted UNESCO csv files, mapping country and
+indicator to the byte ranges holding their rows, stored in a sidecar file next
+to the csv so that it can be reused by a restarted run.
+
+"""
+
+import csv
+import logging
+import zlib
+from hashlib import sha256
+from io import StringIO
+from os import remove, stat
+from os.path import exists
+
+from hdx.utilities.loader import load_json
+from hdx.utilities.saver import save_json
+
+logger = logging.getLogger(__name__)
+
+# increment when the contents of the index change
+indexversion = 5
+
+
+def get_indexpath(path):
+    return f"{path}.index.json"
+
+
+def get_fields(record, maxsplit):
+    if b'"' in record:
+        return next(csv.reader(StringIO(record.decode("utf-8"))))
+    return record.rstrip(b"\r\n").decode("utf-8").split(",", maxsplit)
+
+
+def create_index(lines, source=None):
+    countries = dict()
+    headerline = next(lines)
+    headers = get_fields(headerline, -1)
+    countrycol = headers.index("country_id")
+    indicatorcol = headers.index("indicator_id")
+    if "year" in headers:
+        yearcol = headers.index("year")
+    else:
+        yearcol = None
+    maxsplit = max(countrycol, indicatorcol, yearcol or 0) + 1
+    countriesyears = dict()
+    countriesdigests = dict()
+    counts = dict()
+    rows = 0
+    offset = len(headerline)
+    record = b""
+    start = offset
+    for line in lines:
+        offset += len(line)
+        record += line
+        if record.count(b'"') % 2 == 1:
+            # quoted field containing a line break
+            continue
+        fields = get_fields(record, maxsplit)
+        if len(fields) < maxsplit:
+            # blank line such as at the end of a bulk export or short record
+            record = b""
+            start = offset
+            continue
+        rows += 1
+        countryiso = fields[countrycol]
+        indicator = fields[indicatorcol]
+        ranges = countries.get(countryiso)
+        if ranges is None:
+            countries[countryiso] = [[indicator, start, offset]]
+            countriesyears[countryiso] = set()
+            countriesdigests[countryiso] = sha256()
+        else:
+            lastrange = ranges[-1]
+            if lastrange[0] == indicator and lastrange[2] == start:
+                lastrange[2] = offset
+            else:
+                ranges.append([indicator, start, offset])
+        countriesdigests[countryiso].update(record)
+        counts[countryiso] = counts.get(countryiso, 0) + 1
+        record = b""
+        if yearcol is not None:
+            year = fields[yearcol]
+            if year:
+                countriesyears[countryiso].add(year)
+        start = offset
+    years = {
+        countryiso: sorted(countryyears)
+        for countryiso, countryyears in countriesyears.items()
+    }
+    digests = {
+        countryiso: digest.hexdigest()
+        for countryiso, digest in countriesdigests.items()
+    }
+    return {
+        "version": indexversion,
+        "source": source,
+        "headers": headers,
+        "rows": rows,
+        "countries": countries,
+        "counts": counts,
+        "years": years,
+        "digests": digests,
+    }
+
+
+def save_index(path, index):
+    filestat = stat(path)
+    index["size"] = filestat.st_size
+    index["mtime"] = filestat.st_mtime_ns
+    save_json(index, get_indexpath(path))
+    return index
+
+
+def build_index(path, source=None):
+    with open(path, "rb") as fp:
+        index = create_index(fp, source)
+    return save_index(path, index)
+
+
+def load_index(path, source=None):
+    indexpath = get_indexpath(path)
+    if not exists(path) or not exists(indexpath):
+        return None
+    index = load_json(indexpath)
+    if index.get("version") != indexversion:
+        logger.info(f"Index for {path} is from an older version!")
+        return None
+    filestat = stat(path)
+    if index["size"] != filestat.st_size or index["mtime"] != filestat.st_mtime_ns:
+        logger.info(f"Index for {path} is out of date!")
+        return None
+    if source is not None and index["source"] != source:
+        logger.info(f"Index for {path} is from a different source!")
+        return None
+    return index
+
+
+def get_ranges(index, countryiso, indicators=None):
+    ranges = list()
+    for indicator, start, end in index["countries"].get(countryiso, ()):
+        if indicators is not None and indicator not in indicators:
+            continue
+        if ranges and ranges[-1][1] == start:
+            ranges[-1][1] = end
+        else:
+            ranges.append([start, end])
+    return ranges
+
+
+def compact_datafile(path, level=6):
+    """Writes each country's rows in the csv at path as a zlib stream to
+    <path>.z with an index in which the country's ranges are within its
+    decompressed rows and blobs holds the position of its stream. The csv and
+    its index are deleted."""
+    index = load_index(path)
+    if index is None:
+        index = build_index(path)
+    blobpath = f"{path}.z"
+    countries = dict()
+    blobs = dict()
+    with open(path, "rb") as inputfp, open(blobpath, "wb") as outputfp:
+        for countryiso, ranges in index["countries"].items():
+            chunks = list()
+            countryranges = list()
+            position = 0
+            for indicator, start, end in ranges:
+                inputfp.seek(start)
+                chunks.append(inputfp.read(end - start))
+                countryranges.append([indicator, position, position + end - start])
+                position += end - start
+            data = zlib.compress(b"".join(chunks), level)
+            offset = outputfp.tell()
+            outputfp.write(data)
+            countries[countryiso] = countryranges
+            blobs[countryiso] = [offset, offset + len(data)]
+    index["countries"] = countries
+    index["blobs"] = blobs
+    save_index(blobpath, index)
+    remove(path)
+    remove(get_indexpath(path))
+    return blobpath
+
+
+def read_ranges(path, ranges, blob=None):
+    with open(path, "rb") as fp:
+        if blob is None:
+            for start, end in ranges:
+                fp.seek(start)
+                yield fp.read(end - start).decode("utf-8")
+            return
+        start, end = blob
+        fp.seek(start)
+        data = zlib.decompress(fp.read(end - start))
+    for start, end in ranges:
+        yield data[start:end].decode("utf-8")
+
+
+def get_values(path, ranges, blob=None):
+    for text in read_ranges(path, ranges, blob):
+        yield from csv.reader(StringIO(text, newline=""))
+
+
+def get_rows(path, headers, ranges, row_function=None, blob=None):
+    for values in get_values(path, ranges, blob):
+        row = dict(zip(headers, values))
+        if row_function is not None:
+            row = row_function(headers, row)
+            if row is None:
+                continue
+        yield row
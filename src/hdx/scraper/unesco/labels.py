@@ -0,0 +1,43 @@
+#!/usr/bin/python
+"""
+Labels:
+------
+
+Compact table of indicator labels holding each row as a tuple of interned
+strings, which iterates as dicts like the rows the resource writers expect.
+
+"""
+
+import re
+from sys import intern
+
+whitespace = re.compile(r"\s+")
+# name up to the first of comma, bracket or colon
+shortname = re.compile(r"[^,(:]*")
+
+
+def get_shortname(label):
+    name = shortname.match(label).group()
+    return whitespace.sub(" ", name).strip()
+
+
+class LabelTable:
+    __slots__ = ("headers", "rows")
+
+    def __init__(self, headers):
+        self.headers = tuple(intern(header) for header in headers)
+        self.rows = list()
+
+    def append(self, row):
+        self.rows.append(tuple(intern(row[header]) for header in self.headers))
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, i):
+        return dict(zip(self.headers, self.rows[i]))
+
+    def __iter__(self):
+        headers = self.headers
+        for row in self.rows:
+            yield dict(zip(headers, row))
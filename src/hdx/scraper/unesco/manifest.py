@@ -0,0 +1,64 @@
+#!/usr/bin/python
+"""
+Manifest:
+--------
+
+Hashes of each country's generated dataset so that countries whose content
+has not changed since the previous run can be skipped, and parts of those that
+have changed that are unchanged are not published again.
+
+"""
+
+import json
+import logging
+from hashlib import sha256
+from os.path import basename, exists
+
+from hdx.scraper.unesco.download import get_sha256
+from hdx.utilities.loader import load_json
+from hdx.utilities.saver import save_json
+
+logger = logging.getLogger(__name__)
+
+
+def get_indicatorsetcode(filename):
+    if filename.startswith("qc_"):
+        filename = filename[3:]
+    indicatorsetcode, _, _ = filename.partition("_")
+    return indicatorsetcode
+
+
+def get_hash(value):
+    return sha256(json.dumps(value, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def get_country_hashes(dataset, showcase, bites_disabled, qc_indicators):
+    hashes = dict()
+    for resource in dataset.get_resources():
+        path = resource.get_file_to_upload()
+        indicatorsetcode = get_indicatorsetcode(basename(path))
+        digests = hashes.get(indicatorsetcode, list())
+        digests.append(get_sha256(path))
+        hashes[indicatorsetcode] = digests
+    for indicatorsetcode, digests in hashes.items():
+        hashes[indicatorsetcode] = sha256("".join(digests).encode("utf-8")).hexdigest()
+    hashes["metadata"] = get_hash(
+        [dataset.data, showcase.data, bites_disabled, qc_indicators]
+    )
+    # parts published by separate calls that can be skipped if unchanged
+    hashes["resources"] = get_hash([x["name"] for x in dataset.get_resources()])
+    hashes["quickcharts"] = get_hash([bites_disabled, qc_indicators])
+    hashes["showcase"] = get_hash([dataset["name"], showcase.data])
+    return hashes
+
+
+def load_manifest(path):
+    if path is None or not exists(path):
+        return dict()
+    return load_json(path)
+
+
+def save_manifest(manifest, path):
+    if path is None:
+        return
+    save_json(manifest, path, sortkeys=True)
@@ -0,0 +1,224 @@
+#!/usr/bin/python
+"""
+Metrics:
+-------
+
+Records wall time, rows, bytes and HDX API round trips for each step of a run
+and writes the totals as a JSON summary and a Prometheus textfile, together
+with the rows of each country in each indicator set.
+
+"""
+
+import csv
+import logging
+from contextlib import contextmanager, nullcontext
+from os import makedirs, replace, stat, walk
+from os.path import join
+from threading import Lock, local
+from time import perf_counter, time
+
+from hdx.scraper.unesco.profiler import profile
+from hdx.utilities.saver import save_json, save_text
+
+logger = logging.getLogger(__name__)
+
+counters = (
+    "seconds",
+    "rows_read",
+    "rows_kept",
+    "bytes_read",
+    "bytes_written",
+    "api_calls",
+)
+
+descriptions = {
+    "seconds": "Wall time in seconds",
+    "rows_read": "Rows read",
+    "rows_kept": "Rows kept",
+    "bytes_read": "Bytes read",
+    "bytes_written": "Bytes written",
+    "api_calls": "HDX API round trips",
+}
+
+
+def get_folder_size(folder, seen=None):
+    if seen is None:
+        seen = set()
+    size = 0
+    for root, _, filenames in walk(folder):
+        for filename in filenames:
+            try:
+                result = stat(join(root, filename))
+            except OSError:
+                # removed while walking
+                continue
+            inode = (result.st_dev, result.st_ino)
+            if inode in seen:
+                continue
+            seen.add(inode)
+            size += result.st_size
+    return size
+
+
+class Metrics:
+    """Collects a record for each measured step. Records have a stage, labels
+    such as the indicator set or country and any of the counters. HDX API
+    calls are counted per thread so that uploads running in parallel are
+    attributed to the right country. If there is a profiler, steps are also
+    profiled."""
+
+    def __init__(self, profiler=None):
+        self.records = list()
+        self.lock = Lock()
+        self.apicalls = local()
+        self.totalapicalls = 0
+        self.peakdisk = 0
+        self.start = time()
+        self.profiler = profiler
+        self.coverage = None
+
+    @contextmanager
+    def measure(self, stage, **labels):
+        record = {"stage": stage}
+        record.update(labels)
+        with profile(self.profiler, stage, **labels):
+            start = perf_counter()
+            try:
+                yield record
+            finally:
+                record["seconds"] = round(perf_counter() - start, 3)
+                self.add(record)
+
+    def add(self, record):
+        with self.lock:
+            self.records.append(record)
+
+    def count_api_calls(self, configuration):
+        remoteckan = configuration.remoteckan()
+        call_action = remoteckan.call_action
+
+        def counting_call_action(*args, **kwargs):
+            self.apicalls.count = self.get_api_calls() + 1
+            with self.lock:
+                self.totalapicalls += 1
+            return call_action(*args, **kwargs)
+
+        remoteckan.call_action = counting_call_action
+
+    def sample_disk(self, *folders):
+        """Adds up the size of files in the folders, counting hard links
+        between them once, and keeps the largest total seen"""
+        seen = set()
+        size = sum(get_folder_size(folder, seen) for folder in folders if folder)
+        with self.lock:
+            self.peakdisk = max(self.peakdisk, size)
+        return size
+
+    def get_api_calls(self):
+        return getattr(self.apicalls, "count", 0)
+
+    def get_summary(self, slowest=10):
+        stages = dict()
+        for record in self.records:
+            totals = stages.get(record["stage"])
+            if totals is None:
+                totals = {"count": 0}
+                stages[record["stage"]] = totals
+            totals["count"] += 1
+            for counter in counters:
+                if counter in record:
+                    totals[counter] = totals.get(counter, 0) + record[counter]
+        for totals in stages.values():
+            if "seconds" in totals:
+                totals["seconds"] = round(totals["seconds"], 3)
+        countries = [record for record in self.records if "country" in record]
+        countries = sorted(countries, key=lambda x: x["seconds"], reverse=True)
+        return {
+            "start": self.start,
+            "seconds": round(time() - self.start, 3),
+            "api_calls": self.totalapicalls,
+            "peak_disk_bytes": self.peakdisk,
+            "stages": stages,
+            "slowest": countries[:slowest],
+            "records": self.records,
+        }
+
+
+def measure(metrics, stage, **labels):
+    if metrics is None:
+        return nullcontext(dict())
+    return metrics.measure(stage, **labels)
+
+
+def escape_label(value):
+    """Escapes a label value as the Prometheus exposition format requires"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def get_labels(record):
+    labels = [f'stage="{escape_label(record["stage"])}"']
+    for key, value in record.items():
+        if key == "stage" or key in counters:
+            continue
+        labels.append(f'{key}="{escape_label(value)}"')
+    return ",".join(labels)
+
+
+def get_prometheus_text(summary, prefix="unesco"):
+    lines = [
+        f"# HELP {prefix}_run_start_seconds Start of the run as a Unix timestamp",
+        f"# TYPE {prefix}_run_start_seconds gauge",
+        f"{prefix}_run_start_seconds {summary['start']}",
+        f"# HELP {prefix}_run_seconds Wall time of the run in seconds",
+        f"# TYPE {prefix}_run_seconds gauge",
+        f"{prefix}_run_seconds {summary['seconds']}",
+        f"# HELP {prefix}_api_calls HDX API round trips in the run",
+        f"# TYPE {prefix}_api_calls gauge",
+        f"{prefix}_api_calls {summary['api_calls']}",
+        f"# HELP {prefix}_peak_disk_bytes Largest size of the run's files on disk",
+        f"# TYPE {prefix}_peak_disk_bytes gauge",
+        f"{prefix}_peak_disk_bytes {summary['peak_disk_bytes']}",
+    ]
+    for counter in counters:
+        name = f"{prefix}_stage_{counter}"
+        samples = [
+            f'{name}{{stage="{escape_label(stage)}"}} {totals[counter]}'
+            for stage, totals in summary["stages"].items()
+            if counter in totals
+        ]
+        if not samples:
+            continue
+        lines.append(f"# HELP {name} {descriptions[counter]} for each stage")
+        lines.append(f"# TYPE {name} gauge")
+        lines.extend(samples)
+    name = f"{prefix}_slowest_seconds"
+    lines.append(f"# HELP {name} Wall time of the slowest country steps")
+    lines.append(f"# TYPE {name} gauge")
+    for record in summary["slowest"]:
+        lines.append(f"{name}{{{get_labels(record)}}} {record['seconds']}")
+    return "\n".join(lines) + "\n"
+
+
+def save_coverage(coverage, path):
+    indicatorsetcodes = sorted({x for rows in coverage.values() for x in rows})
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["country_id"] + indicatorsetcodes + ["total"])
+        for countryiso, rows in coverage.items():
+            counts = [rows.get(x, 0) for x in indicatorsetcodes]
+            writer.writerow([countryiso] + counts + [sum(counts)])
+
+
+def save_metrics(metrics, folder):
+    if folder is None:
+        return
+    makedirs(folder, exist_ok=True)
+    summary = metrics.get_summary()
+    save_json(summary, join(folder, "metrics.json"))
+    # textfile collectors may read at any time so write then rename
+    path = join(folder, "unesco.prom")
+    save_text(get_prometheus_text(summary), f"{path}.tmp")
+    replace(f"{path}.tmp", path)
+    if metrics.coverage is not None:
+        save_coverage(metrics.coverage, join(folder, "coverage.csv"))
+    logger.info(f"Saved metrics to {folder}")
@@ -0,0 +1,79 @@
+#!/usr/bin/python
+"""
+Offline:
+-------
+
+Generates datasets without HDX, using the country data bundled with HDX
+Python Country for locations, the scraper's own tags as the approved
+vocabulary and the formats of the files it writes as the resource formats, and
+saves each country's dataset, showcase and resources to a
+folder instead of creating them in HDX.
+
+"""
+
+import logging
+from os import makedirs
+from os.path import basename, join
+
+from hdx.api.locations import Locations
+from hdx.data.resource import Resource
+from hdx.data.vocabulary import Vocabulary
+from hdx.location.country import Country
+from hdx.scraper.unesco.download import link_or_copy
+from hdx.scraper.unesco.pipeline import tags
+from hdx.utilities.saver import save_json
+
+logger = logging.getLogger(__name__)
+
+formats = ("csv", "json", "zip")
+
+
+def setup_offline():
+    countriesdata = Country.countriesdata(use_live=False)
+    Locations.set_validlocations(
+        [
+            {
+                "name": countryiso.lower(),
+                "title": Country.get_country_name_from_iso3(countryiso),
+            }
+            for countryiso in countriesdata["countries"]
+        ]
+    )
+    Vocabulary._tags_dict = {
+        "sustainable development goals": {
+            "Action to Take": "merge",
+            "New Tag(s)": "sustainable development goals-sdg",
+        }
+    }
+    Vocabulary._approved_vocabulary = {
+        "tags": [{"name": tag} for tag in tags],
+        "id": "offline",
+        "name": "approved",
+    }
+    # otherwise downloaded from GitHub by the first Resource.set_format
+    Resource.set_formatsdict({x: x for x in formats})
+
+
+def save_offline(folder, dataset, showcase, bites_disabled, qc_indicators):
+    """Saves what create_in_hdx would create to dataset.json, showcase.json
+    and, if there are QuickCharts, quickcharts.json in folder together with
+    the resource files"""
+    makedirs(folder, exist_ok=True)
+    if qc_indicators:
+        resourceview = dataset.generate_quickcharts(
+            -1, bites_disabled=bites_disabled, indicators=qc_indicators
+        )
+    else:
+        resourceview = None
+    datasetdict = dataset.get_dataset_dict()
+    for resourcedict, resource in zip(
+        datasetdict.get("resources", ()), dataset.get_resources()
+    ):
+        filename = basename(resource.get_file_to_upload())
+        link_or_copy(resource.get_file_to_upload(), join(folder, filename))
+        resourcedict["file"] = filename
+    save_json(datasetdict, join(folder, "dataset.json"))
+    save_json(showcase.data, join(folder, "showcase.json"))
+    if resourceview:
+        save_json(resourceview.data, join(folder, "quickcharts.json"))
+    logger.info(f"Saved {dataset['name']} to {folder}")
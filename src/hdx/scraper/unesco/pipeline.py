@@ -7,25 +7,59 @@ Reads UNESCO bulk files and creates datasets.
 
 """
 
+import csv
 import logging
-import re
-from os import remove, rename
-from os.path import exists, join, split
-from shutil import copyfileobj
-from urllib.request import urlretrieve
-from zipfile import ZipFile
+from concurrent.futures import ThreadPoolExecutor
+from functools import cache, partial
+from io import TextIOWrapper
+from itertools import chain
+from os import makedirs, remove
+from os.path import dirname, exists, getsize, join, split
+from zipfile import ZipFile, is_zipfile
 
 from slugify import slugify
 
 from hdx.data.dataset import Dataset
 from hdx.data.hdxobject import HDXError
+from hdx.data.resource import Resource
 from hdx.data.showcase import Showcase
 from hdx.location.country import Country
+from hdx.scraper.unesco.download import (
+    cached_urlretrieve,
+    get_sha256,
+    link_or_copy,
+    urlretrieve,
+)
+from hdx.scraper.unesco.index import (
+    build_index,
+    compact_datafile,
+    create_index,
+    get_ranges,
+    get_values,
+    load_index,
+    save_index,
+)
+from hdx.scraper.unesco.labels import LabelTable, get_shortname
+from hdx.scraper.unesco.metrics import measure
 from hdx.utilities.dateparse import default_date, default_enddate, parse_date_range
-from hdx.utilities.dictandlist import dict_of_lists_add, dict_of_sets_add
+from hdx.utilities.downloader import Download
+from hdx.utilities.loader import load_json
+from hdx.utilities.saver import save_iterable, save_json
 
 logger = logging.getLogger(__name__)
 
+organisation = "18f2d467-dcf8-4b7e-bffa-b3c338ba3a7c"
+
+tags = (
+    "sustainable development",
+    "demographics",
+    "socioeconomics",
+    "education",
+    "indicators",
+    "sustainable development goals-sdg",
+    "hxl",
+)
+
 hxltags = {
     "indicator_id": "#indicator+code",
     "indicator_label_en": "#indicator+name",
@@ -38,54 +72,125 @@ hxltags = {
 
 
 def download_indicatorsets(
-    base_url, folder, indicatorsetcodes, urlretrieve=urlretrieve
+    base_url,
+    folder,
+    indicatorsetcodes,
+    urlretrieve=urlretrieve,
+    max_workers=3,
+    cachefolder=None,
+    metrics=None,
+    revalidate=True,
 ):
-    indicatorsets = dict()
-    for indicatorsetcode in indicatorsetcodes:
+    if cachefolder:
+        urlretrieve = partial(
+            cached_urlretrieve,
+            cachefolder=cachefolder,
+            urlretrieve=urlretrieve,
+            revalidate=revalidate,
+        )
+
+    def retrieve(indicatorsetcode, record):
         filename = f"{indicatorsetcode}.zip"
         path = join(folder, filename)
-        statusfile = join(folder, f"{indicatorsetcode}.txt")
+        checksumfile = join(folder, f"{indicatorsetcode}.json")
         if exists(path):
-            if exists(statusfile):
-                with open(statusfile) as f:
-                    status = f.read()
-                    if status == "OK":
-                        indicatorsets[indicatorsetcode] = path
-                        continue
-                remove(statusfile)
+            if exists(checksumfile):
+                checksum = load_json(checksumfile)
+                if getsize(path) == checksum["size"]:
+                    if get_sha256(path) == checksum["sha256"]:
+                        record["bytes_written"] = 0
+                        return path
+                logger.warning(f"{path} does not match its checksum!")
+                remove(checksumfile)
             remove(path)
         url = f"{base_url}{filename}"
         path, headers = urlretrieve(url, path)
-        if "zip" not in headers.get_content_type():
+        if "zip" not in headers.get_content_type() or not is_zipfile(path):
             raise OSError(f"Problem with {path}!")
-        with open(statusfile, "w") as f:
-            f.write("OK")
-            indicatorsets[indicatorsetcode] = path
-    return indicatorsets
+        checksum = {"size": getsize(path), "sha256": get_sha256(path)}
+        save_json(checksum, checksumfile)
+        record["bytes_written"] = checksum["size"]
+        return path
+
+    def download(indicatorsetcode):
+        with measure(metrics, "download", set=indicatorsetcode) as record:
+            return retrieve(indicatorsetcode, record)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        paths = executor.map(download, indicatorsetcodes)
+        return dict(zip(indicatorsetcodes, paths))
+
+
+def get_member_rows(zipfile, inputfile, encoding="utf-8-sig"):
+    inputfp = TextIOWrapper(zipfile.open(inputfile), encoding=encoding, newline="")
+    reader = csv.reader(inputfp)
+    headers = [header.lower() for header in next(reader)]
 
+    def get_rows():
+        with inputfp:
+            for values in reader:
+                if values:
+                    yield dict(zip(headers, values))
 
-def get_filepath(zipfile, inputfile, outputfolder, indicatorsetcode):
+    return headers, get_rows()
+
+
+def get_filepath(zipfile, inputfile, outputfolder, indicatorsetcode, metrics=None):
+    zipinfo = zipfile.getinfo(inputfile)
+    source = {"crc": zipinfo.CRC, "size": zipinfo.file_size}
     folder, filename = split(inputfile)
-    origfolder = join(outputfolder, indicatorsetcode)
     if folder:
-        zipfolder = outputfolder
+        path = join(outputfolder, inputfile)
     else:
-        zipfolder = origfolder
-    inputpath = zipfile.extract(inputfile, path=zipfolder)
-    origpath = join(origfolder, f"orig_{filename}")
+        path = join(outputfolder, indicatorsetcode, filename)
+    with measure(metrics, "extract", set=indicatorsetcode, file=filename) as record:
+        if load_index(path, source):
+            logger.info(f"Reusing extracted {path} and its index")
+            record["bytes_written"] = 0
+            return path
+        makedirs(dirname(path), exist_ok=True)
+        with zipfile.open(inputfile) as inputfp:
+            with open(path, "wb") as outputfp:
+
+                def get_lines():
+                    lines = iter(inputfp)
+                    line = next(lines).lower()
+                    for line in chain((line,), lines):
+                        if line.endswith(b"\r\n"):
+                            line = line[:-2] + b"\n"
+                        outputfp.write(line)
+                        yield line
 
-    rename(inputpath, origpath)
-    with open(origpath, mode="rt") as inputfp:
-        line = inputfp.readline().lower()
-        with open(inputpath, "w") as outputfp:
-            outputfp.write(line)
-            copyfileobj(inputfp, outputfp)
-    return inputpath
+                index = create_index(get_lines(), source)
+        save_index(path, index)
+        record["rows_read"] = index["rows"]
+        record["bytes_read"] = zipinfo.compress_size
+        record["bytes_written"] = index["size"]
+    return path
 
 
-def get_countriesdata(indicatorsets, downloader, folder):
+def generate_indicatorlist(indheaders, indicatorsetindicators, folder, filename):
+    # written once per indicator set and linked into each country's folder
+    path = join(folder, filename)
+    rows = chain(
+        (Download.hxl_row(indheaders, hxltags, dict_form=True),),
+        indicatorsetindicators["rows"],
+    )
+    save_iterable(path, rows, indheaders, indheaders)
+    indicatorsetindicators["path"] = path
+    indicatorsetindicators["names"] = ", ".join(
+        sorted(indicatorsetindicators["shortnames"])
+    )
+
+
+def get_countriesdata(indicatorsets, folder, metrics=None, low_disk=False):
+    """Countries with rows in any indicator set are returned largest first,
+    together with the number of rows of each in each set. If low_disk is True,
+    each set's extracted csvs are compacted and its zip deleted before the
+    next set is extracted."""
     indheaders = None
     countriesset = set()
+    coverage = dict()
     datafiles = dict()
     indicatorsetsdates = dict()
     indicatorsetsindicators = dict()
@@ -115,52 +220,251 @@ def get_countriesdata(indicatorsets, downloader, folder):
                 raise (OSError("No indicator file in zip!"))
             if cntfile is None:
                 raise (OSError("No country file in zip!"))
-            indpath = get_filepath(zipfile, indfile, folder, indicatorsetcode)
-            indheaders, iterator = downloader.get_tabular_rows(
-                indpath,
-                headers=1,
-                dict_form=True,
-                format="csv",
-                encoding="WINDOWS-1252",
-            )
-            indicatorsetindicators = indicatorsetsindicators.get(
-                indicatorsetcode, dict()
+            indheaders, iterator = get_member_rows(
+                zipfile, indfile, encoding="WINDOWS-1252"
             )
+            labels = LabelTable(indheaders)
+            shortnames = set()
             for row in iterator:
-                dict_of_lists_add(indicatorsetindicators, "rows", row)
-                indicator_name = row["indicator_label_en"]
-                ind0 = re.sub(r"\s+", " ", indicator_name)
-                ind1, _, _ = ind0.partition(",")
-                ind2, _, _ = ind1.partition("(")
-                indicator_name, _, _ = ind2.partition(":")
-                dict_of_sets_add(
-                    indicatorsetindicators, "shortnames", indicator_name.strip()
-                )
+                labels.append(row)
+                shortnames.add(get_shortname(row["indicator_label_en"]))
+            indicatorsetindicators = {"rows": labels, "shortnames": shortnames}
             indicatorsetsindicators[indicatorsetcode] = indicatorsetindicators
-
-            cntpath = get_filepath(zipfile, cntfile, folder, indicatorsetcode)
-            _, iterator = downloader.get_tabular_rows(
-                cntpath, headers=1, dict_form=True, format="csv"
+            outputfolder = join(folder, indicatorsetcode)
+            makedirs(outputfolder, exist_ok=True)
+            generate_indicatorlist(
+                indheaders,
+                indicatorsetindicators,
+                outputfolder,
+                f"{indicatorsetcode}_indicatorlist.csv",
             )
+
+            _, iterator = get_member_rows(zipfile, cntfile)
             for row in iterator:
                 countriesset.add(row["country_id"])
 
             if metadatafile:
                 metadatapath = get_filepath(
-                    zipfile, metadatafile, folder, indicatorsetcode
+                    zipfile, metadatafile, folder, indicatorsetcode, metrics
                 )
             else:
                 metadatapath = None
-            datapath = get_filepath(zipfile, datafile, folder, indicatorsetcode)
-            datafiles[indicatorsetcode] = (metadatapath, datapath)
+            datapath = get_filepath(
+                zipfile, datafile, folder, indicatorsetcode, metrics
+            )
+        if metrics is not None:
+            metrics.sample_disk(folder)
+        if low_disk:
+            with measure(metrics, "compact", set=indicatorsetcode):
+                if metadatapath:
+                    metadatapath = compact_datafile(metadatapath)
+                datapath = compact_datafile(datapath)
+            # so a resumed run downloads or takes the zip from the cache again
+            remove(path)
+        datafiles[indicatorsetcode] = (metadatapath, datapath)
+        for countryiso, rows in load_index(datapath)["counts"].items():
+            countrycoverage = coverage.get(countryiso)
+            if countrycoverage is None:
+                countrycoverage = dict()
+                coverage[countryiso] = countrycoverage
+            countrycoverage[indicatorsetcode] = rows
     countries = list()
-    for countryiso in sorted(list(countriesset)):
+    # largest first so that the slowest countries do not hold up the end of
+    # parallel and sharded runs
+    for countryiso in sorted(coverage, key=lambda x: (-sum(coverage[x].values()), x)):
+        if countryiso not in countriesset:
+            continue
         iso2 = Country.get_iso2_from_iso3(countryiso)
         countryname = Country.get_country_name_from_iso3(countryiso)
         if iso2 is None or countryname is None:
             continue
         countries.append({"iso3": countryiso, "iso2": iso2, "countryname": countryname})
-    return countries, indheaders, indicatorsetsindicators, indicatorsetsdates, datafiles
+    logger.info(
+        f"{len(countriesset) - len(countries)} countries have no data or are unknown"
+    )
+    coverage = {country["iso3"]: coverage[country["iso3"]] for country in countries}
+    return (
+        countries,
+        indheaders,
+        indicatorsetsindicators,
+        indicatorsetsdates,
+        datafiles,
+        coverage,
+    )
+
+
+def partition_datafile(path, qcindicators=None, countryisos=None):
+    index = load_index(path)
+    if index is None:
+        index = build_index(path)
+    headers = index["headers"]
+    years = index["years"]
+    digests = index["digests"]
+    partitions = dict()
+    for countryiso in index["countries"]:
+        if countryisos is not None and countryiso not in countryisos:
+            continue
+        partition = {
+            "path": path,
+            "headers": headers,
+            "ranges": get_ranges(index, countryiso),
+            "years": years[countryiso],
+            "digest": digests[countryiso],
+        }
+        if "blobs" in index:
+            # compacted so the ranges are within the country's zlib stream
+            partition["blob"] = index["blobs"][countryiso]
+        if qcindicators:
+            partition["qcranges"] = get_ranges(index, countryiso, qcindicators)
+        partitions[countryiso] = partition
+    return partitions
+
+
+def partition_datafiles(datafiles, indicatorsetcodes=None, countryisos=None):
+    """Partitions each indicator set's files by country, only for the
+    countries in countryisos if it is given"""
+    countriesdatafiles = dict()
+    for indicatorsetcode, (metadatapath, datapath) in datafiles.items():
+        if indicatorsetcodes:
+            indicators_for_qc = indicatorsetcodes[indicatorsetcode].get("quickcharts")
+        else:
+            indicators_for_qc = None
+        if indicators_for_qc:
+            qcindicators = {x["code"] for x in indicators_for_qc}
+        else:
+            qcindicators = None
+        datapartitions = partition_datafile(datapath, qcindicators, countryisos)
+        if metadatapath:
+            metadatapartitions = partition_datafile(metadatapath, None, countryisos)
+        else:
+            metadatapartitions = dict()
+        for countryiso, datapartition in datapartitions.items():
+            countrydatafiles = countriesdatafiles.get(countryiso, dict())
+            countrydatafiles[indicatorsetcode] = (
+                metadatapartitions.get(countryiso),
+                datapartition,
+            )
+            countriesdatafiles[countryiso] = countrydatafiles
+        logger.info(
+            f"Partitioned {indicatorsetcode} data into {len(datapartitions)} countries"
+        )
+    return countriesdatafiles
+
+
+def write_values(path, headers, rows):
+    """Writes the headers, HXL row and rows given as lists of values as
+    generate_resource_from_iterable would write them from dicts, returning
+    the number of rows"""
+    makedirs(dirname(path), exist_ok=True)
+    width = len(headers)
+    count = 0
+    with open(path, "w", encoding="utf-8", newline="") as outputfp:
+        writer = csv.writer(outputfp)
+        writer.writerow(headers)
+        writer.writerow(Download.hxl_row(headers, hxltags))
+        for values in rows:
+            if len(values) != width:
+                values = (values + [""] * width)[:width]
+            writer.writerow(values)
+            count += 1
+    return count
+
+
+def generate_partition_resource(dataset, datafile, folder, filename, resourcedata):
+    # partitions only contain the country's rows so they are copied as lists
+    # without building a dict for each
+    path = join(folder, filename)
+    rows = get_values(datafile["path"], datafile["ranges"], datafile.get("blob"))
+    count = write_values(path, datafile["headers"], rows)
+    if count == 0:
+        remove(path)
+        return 0
+    add_file_resource(dataset, path, resourcedata)
+    return count
+
+
+def generate_quickcharts_resource(
+    dataset, datafile, quickcharts, folder, filename, resourcedata
+):
+    # equivalent of the quickcharts cutdown in generate_resource_from_iterable
+    # reading only the quickcharts indicators' rows if they are known
+    indicatorcol = next(
+        key for key, value in hxltags.items() if value == quickcharts["hashtag"]
+    )
+    numericcol = next(
+        key for key, value in hxltags.items() if value == quickcharts["numeric_hashtag"]
+    )
+    cutdowncols = [
+        key for key, value in hxltags.items() if value in quickcharts["cutdownhashtags"]
+    ]
+    if numericcol not in cutdowncols:
+        cutdowncols.append(numericcol)
+    headers = datafile["headers"]
+    indicatorindex = headers.index(indicatorcol)
+    numericindex = headers.index(numericcol)
+    qcindexes = [i for i, x in enumerate(headers) if x in cutdowncols]
+    values = quickcharts["values"]
+    bites_disabled = [True, True, True]
+    ranges = datafile.get("qcranges", datafile["ranges"])
+
+    def get_qcrows():
+        for row in get_values(datafile["path"], ranges, datafile.get("blob")):
+            indicator = row[indicatorindex]
+            if indicator not in values:
+                continue
+            try:
+                float(row[numericindex])
+            except (TypeError, ValueError):
+                continue
+            bites_disabled[values.index(indicator)] = False
+            yield [row[i] for i in qcindexes]
+
+    path = join(folder, f"qc_{filename}")
+    write_values(path, [headers[i] for i in qcindexes], get_qcrows())
+    qc_resourcedata = {
+        "name": f"QuickCharts-{resourcedata['name']}",
+        "description": "Cut down data for QuickCharts",
+    }
+    add_file_resource(dataset, path, qc_resourcedata)
+    return bites_disabled
+
+
+def generate_country_resource(
+    dataset, datafile, folder, filename, resourcedata, quickcharts=None
+):
+    """Returns the number of rows written from the country's partition of a
+    data or metadata file and the QuickCharts bites to disable if quickcharts
+    is given"""
+    rows = generate_partition_resource(
+        dataset, datafile, folder, filename, resourcedata
+    )
+    if rows == 0 or quickcharts is None:
+        return rows, None
+    bites_disabled = generate_quickcharts_resource(
+        dataset, datafile, quickcharts, folder, filename, resourcedata
+    )
+    return rows, bites_disabled
+
+
+def add_file_resource(dataset, path, resourcedata):
+    resource = Resource(resourcedata)
+    resource.set_format("csv")
+    resource.set_file_to_upload(path)
+    dataset.add_update_resource(resource)
+
+
+def reuse_resources(dataset, folder, resources):
+    paths = [join(folder, filename) for _, filename in resources]
+    if not all(exists(path) for path in paths):
+        return False
+    for (resourcedata, _), path in zip(resources, paths):
+        add_file_resource(dataset, path, resourcedata)
+    return True
+
+
+@cache
+def get_year_range(year):
+    return parse_date_range(year, zero_time=True, max_endtime=True)
 
 
 def generate_dataset_and_showcase(
@@ -170,8 +474,9 @@ def generate_dataset_and_showcase(
     indicatorsetsdates,
     country,
     datafiles,
-    downloader,
     folder,
+    record=None,
+    unchanged=None,
 ):
     countryiso = country["iso3"]
     countryname = country["countryname"]
@@ -181,65 +486,36 @@ def generate_dataset_and_showcase(
     dataset = Dataset({"name": slugified_name, "title": title})
 
     dataset.set_maintainer("a5c5296a-3206-4e51-b2de-bfe34857185f")
-    dataset.set_organization("18f2d467-dcf8-4b7e-bffa-b3c338ba3a7c")
+    dataset.set_organization(organisation)
     dataset.set_expected_update_frequency("Never")
     dataset.set_subnational(False)
     try:
         dataset.add_country_location(countryiso)
     except HDXError as e:
         logger.exception(f"{countryname} has a problem! {e}")
-        return None, None, None
-    tags = [
-        "sustainable development",
-        "demographics",
-        "socioeconomics",
-        "education",
-        "indicators",
-        "sustainable development goals-sdg",
-        "hxl",
-    ]
-    dataset.add_tags(tags)
-
-    earliest_start_date = default_enddate
-    latest_end_date = default_date
-
-    def process_row(headers, row):
-        nonlocal earliest_start_date, latest_end_date
-        if row["country_id"] != countryiso:
-            return None
-        year = row["year"]
-        if year:
-            startdate, enddate = parse_date_range(
-                year,
-                zero_time=True,
-                max_endtime=True,
-            )
-            if startdate < earliest_start_date:
-                earliest_start_date = startdate
-            if enddate > latest_end_date:
-                latest_end_date = enddate
-        return row
-
-    def process_metadata_row(headers, row):
-        if row["country_id"] == countryiso:
-            return row
-        else:
-            return None
+        return None, None, None, None
+    dataset.add_tags(list(tags))
 
+    years = set()
     categories = list()
     bites_disabled = None
     qc_indicators = None
 
     for indicatorsetcode in indicatorsetcodes:
         indicatorsetname = indicatorsetcodes[indicatorsetcode]["title"]
+        if indicatorsetcode not in datafiles:
+            logger.warning(f"{indicatorsetname} data for {countryname} has no data!")
+            continue
         metadatafile, datafile = datafiles[indicatorsetcode]
         indicatorsetindicators = indicatorsetsindicators[indicatorsetcode]
-        indicator_names = indicatorsetindicators["shortnames"]
+        indicator_names = indicatorsetindicators.get("names")
+        if indicator_names is None:
+            indicator_names = ", ".join(sorted(indicatorsetindicators["shortnames"]))
         filename = f"{indicatorsetcode}_data_{countryiso}.csv"
         resourcename = f"{indicatorsetname} data"
         resourcedata = {
             "name": resourcename,
-            "description": f"{indicatorsetname} data with HXL tags.\n\nIndicators: {', '.join(sorted(indicator_names))}",
+            "description": f"{indicatorsetname} data with HXL tags.\n\nIndicators: {indicator_names}",
         }
         indicators_for_qc = indicatorsetcodes[indicatorsetcode].get("quickcharts")
         if indicators_for_qc:
@@ -255,20 +531,33 @@ def generate_dataset_and_showcase(
         else:
             quickcharts = None
         outputfolder = join(folder, indicatorsetcode)
-        success, results = dataset.download_and_generate_resource(
-            downloader,
+        years.update(datafile["years"])
+        if unchanged and indicatorsetcode in unchanged:
+            # rows are the same as in the previous release so use the
+            # resources generated from them then
+            release = unchanged[indicatorsetcode]
+            if reuse_resources(dataset, outputfolder, release["resources"]):
+                logger.info(f"{indicatorsetname} for {countryname} is unchanged")
+                if release.get("bites_disabled"):
+                    bites_disabled = release["bites_disabled"]
+                if release["resources"]:
+                    categories.append(
+                        f"{indicatorsetname} (made {indicatorsetsdates[indicatorsetcode]})"
+                    )
+                continue
+        rows, disabled_bites = generate_country_resource(
+            dataset,
             datafile,
-            hxltags,
             outputfolder,
             filename,
             resourcedata,
-            row_function=process_row,
-            quickcharts=quickcharts,
+            quickcharts,
         )
-        if success is False:
+        if rows == 0:
             logger.warning(f"{resourcename} for {countryname} has no data!")
             continue
-        disabled_bites = results.get("bites_disabled")
+        if record is not None:
+            record["rows_kept"] += rows
         if disabled_bites:
             bites_disabled = disabled_bites
         filename = f"{indicatorsetcode}_indicatorlist_{countryiso}.csv"
@@ -277,13 +566,19 @@ def generate_dataset_and_showcase(
             "name": resourcename,
             "description": f"{indicatorsetname} indicator list with HXL tags",
         }
-        indicators = indicatorsetindicators["rows"]
-        success, _ = dataset.generate_resource_from_iterable(
-            indheaders, indicators, hxltags, outputfolder, filename, resourcedata
-        )
-        if success is False:
-            logger.warning(f"{resourcename} for {countryname} has no data!")
-            continue
+        indicatorlistpath = indicatorsetindicators.get("path")
+        if indicatorlistpath:
+            path = join(outputfolder, filename)
+            link_or_copy(indicatorlistpath, path)
+            add_file_resource(dataset, path, resourcedata)
+        else:
+            indicators = indicatorsetindicators["rows"]
+            success, _ = dataset.generate_resource_from_iterable(
+                indheaders, indicators, hxltags, outputfolder, filename, resourcedata
+            )
+            if success is False:
+                logger.warning(f"{resourcename} for {countryname} has no data!")
+                continue
         categories.append(
             f"{indicatorsetname} (made {indicatorsetsdates[indicatorsetcode]})"
         )
@@ -294,21 +589,29 @@ def generate_dataset_and_showcase(
                 "name": resourcename,
                 "description": f"{indicatorsetname} metadata with HXL tags",
             }
-            success, results = dataset.download_and_generate_resource(
-                downloader,
+            rows, _ = generate_country_resource(
+                dataset,
                 metadatafile,
-                hxltags,
                 outputfolder,
                 filename,
                 resourcedata,
-                row_function=process_metadata_row,
             )
-            if success is False:
+            if rows == 0:
                 logger.warning(f"{resourcename} for {countryname} has no data!")
                 continue
+            if record is not None:
+                record["rows_kept"] += rows
     if dataset.number_of_resources() == 0:
         logger.warning(f"{countryname} has no data!")
         return None, None, None, None
+    earliest_start_date = default_enddate
+    latest_end_date = default_date
+    for year in years:
+        startdate, enddate = get_year_range(year)
+        if startdate < earliest_start_date:
+            earliest_start_date = startdate
+        if enddate > latest_end_date:
+            latest_end_date = enddate
     dataset.set_time_period(earliest_start_date, latest_end_date)
     dataset.quickcharts_resource_last()
     notes = [
@@ -327,6 +630,6 @@ def generate_dataset_and_showcase(
             "image_url": "https://tcg.uis.unesco.org/wp-content/uploads/sites/4/2021/09/combined_uis_colors_eng-002-300x240.png",
         }
     )
-    showcase.add_tags(tags)
+    showcase.add_tags(list(tags))
 
     return dataset, showcase, bites_disabled, qc_indicators
@@ -0,0 +1,98 @@
+#!/usr/bin/python
+"""
+Profiler:
+--------
+
+Profiles each stage of a run and, if asked, each country with cProfile and
+tracemalloc, writing pstats files and summaries of the functions taking the
+most time and the lines allocating the most memory.
+
+"""
+
+import cProfile
+import logging
+import pstats
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from os import makedirs
+from os.path import join
+from threading import Lock, local
+
+logger = logging.getLogger(__name__)
+
+
+class Profiler:
+    """Writes <stage>[-<label>...].pstats and .txt to folder for each step
+    profiled. Steps with a country label are only profiled if countries is
+    True. A step started while another is being profiled in the same thread
+    is included in the outer one. tracemalloc traces all threads so the
+    allocations of uploads running in parallel overlap."""
+
+    def __init__(self, folder, countries=False, top=30):
+        self.folder = folder
+        self.countries = countries
+        self.top = top
+        self.lock = Lock()
+        self.tracing = 0
+        self.active = local()
+        makedirs(folder, exist_ok=True)
+
+    def start_tracing(self):
+        with self.lock:
+            if self.tracing == 0:
+                tracemalloc.start()
+            self.tracing += 1
+        return tracemalloc.take_snapshot()
+
+    def stop_tracing(self, before):
+        after = tracemalloc.take_snapshot()
+        peak = tracemalloc.get_traced_memory()[1]
+        with self.lock:
+            self.tracing -= 1
+            if self.tracing == 0:
+                tracemalloc.stop()
+        return after.compare_to(before, "lineno"), peak
+
+    @contextmanager
+    def profile(self, stage, **labels):
+        if getattr(self.active, "name", None) is not None:
+            yield
+            return
+        name = "-".join([stage] + [str(x) for x in labels.values()])
+        self.active.name = name
+        before = self.start_tracing()
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # only one profiler can be enabled at a time from Python 3.12
+            profile = None
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            allocations, peak = self.stop_tracing(before)
+            self.active.name = None
+            self.save(name, profile, allocations, peak)
+
+    def save(self, name, profile, allocations, peak):
+        path = join(self.folder, name)
+        with open(f"{path}.txt", "w") as f:
+            if profile is None:
+                f.write("Not profiled as another profiler was active\n")
+            else:
+                profile.dump_stats(f"{path}.pstats")
+                stats = pstats.Stats(profile, stream=f)
+                stats.sort_stats("cumulative").print_stats(self.top)
+            f.write(f"Peak traced memory: {peak / 1048576:.1f} MB\n")
+            f.write(f"Top {self.top} allocations:\n")
+            for allocation in allocations[: self.top]:
+                f.write(f"{allocation}\n")
+        logger.info(f"Saved profile of {name} to {path}")
+
+
+def profile(profiler, stage, **labels):
+    if profiler is None or ("country" in labels and not profiler.countries):
+        return nullcontext()
+    return profiler.profile(stage, **labels)
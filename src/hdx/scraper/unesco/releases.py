@@ -0,0 +1,109 @@
+#!/usr/bin/python
+"""
+Releases:
+--------
+
+Digests of each country's rows in each indicator set so that a new UNESCO
+release can be compared with the previous one during preparation and only the
+changed country and indicator set pairs regenerated.
+
+"""
+
+import json
+import logging
+from hashlib import sha256
+from os.path import basename
+
+from hdx.scraper.unesco.download import get_sha256
+from hdx.scraper.unesco.manifest import get_indicatorsetcode
+
+logger = logging.getLogger(__name__)
+
+
+def get_set_digests(indicatorsetcodes, indicatorsetsindicators, indicatorsetsdates):
+    setdigests = dict()
+    for indicatorsetcode, indicatorset in indicatorsetcodes.items():
+        indicatorsetindicators = indicatorsetsindicators.get(indicatorsetcode)
+        if indicatorsetindicators is None:
+            continue
+        path = indicatorsetindicators.get("path")
+        if path:
+            labels = get_sha256(path)
+        else:
+            labels = sorted(indicatorsetindicators["shortnames"])
+        setdigests[indicatorsetcode] = [
+            indicatorset,
+            indicatorsetsdates.get(indicatorsetcode),
+            labels,
+        ]
+    return setdigests
+
+
+def get_pair_digests(
+    indicatorsetcodes,
+    indicatorsetsindicators,
+    indicatorsetsdates,
+    countriesdatafiles,
+    salt=None,
+):
+    """Returns for each country a digest for each indicator set covering the
+    country's data and metadata rows, the set's configuration, release date and
+    indicator list. salt should change when the generated output would."""
+    setdigests = get_set_digests(
+        indicatorsetcodes, indicatorsetsindicators, indicatorsetsdates
+    )
+    countriesdigests = dict()
+    for countryiso, countrydatafiles in countriesdatafiles.items():
+        digests = dict()
+        for indicatorsetcode, (metadatafile, datafile) in countrydatafiles.items():
+            setdigest = setdigests.get(indicatorsetcode)
+            if setdigest is None:
+                continue
+            if metadatafile:
+                metadatadigest = metadatafile["digest"]
+            else:
+                metadatadigest = None
+            parts = [
+                salt,
+                setdigest,
+                datafile["headers"],
+                datafile["digest"],
+                metadatadigest,
+            ]
+            digest = json.dumps(parts, sort_keys=True).encode("utf-8")
+            digests[indicatorsetcode] = sha256(digest).hexdigest()
+        countriesdigests[countryiso] = digests
+    return countriesdigests
+
+
+def get_unchanged_sets(release, digests):
+    if not release:
+        return dict()
+    unchanged = dict()
+    for indicatorsetcode, digest in digests.items():
+        setrelease = release.get(indicatorsetcode)
+        if setrelease and setrelease["digest"] == digest:
+            unchanged[indicatorsetcode] = setrelease
+    return unchanged
+
+
+def is_unchanged(release, digests):
+    if not release or release.keys() != digests.keys():
+        return False
+    return len(get_unchanged_sets(release, digests)) == len(digests)
+
+
+def get_release(digests, resources, bites_disabled):
+    release = {
+        indicatorsetcode: {"digest": digest, "resources": list()}
+        for indicatorsetcode, digest in digests.items()
+    }
+    for resourcedata, path in resources:
+        filename = basename(path)
+        setrelease = release.get(get_indicatorsetcode(filename))
+        if setrelease is None:
+            continue
+        setrelease["resources"].append([resourcedata, filename])
+        if filename.startswith("qc_"):
+            setrelease["bites_disabled"] = bites_disabled
+    return release
@@ -0,0 +1,157 @@
+#!/usr/bin/python
+"""
+Scheduler:
+---------
+
+Paces the requests made to HDX by all upload threads with a shared token
+bucket, limits how many are in flight, adapting the limit to latency and
+throttling, and retries throttled, failed and dropped requests with jittered
+exponential backoff.
+
+"""
+
+import logging
+from functools import partial
+from random import random
+from threading import Condition
+from time import monotonic, sleep
+
+from requests import ConnectionError, Timeout
+
+logger = logging.getLogger(__name__)
+
+retry_statuses = (429, 500, 502, 503, 504)
+
+
+def rewind(files):
+    if not files:
+        return
+    for value in files.values():
+        if isinstance(value, tuple):
+            value = value[1]
+        if hasattr(value, "seek"):
+            value.seek(0)
+
+
+def get_retry_after(response):
+    try:
+        return float(response.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+class Scheduler:
+    """Requests wait for a token from a bucket refilled at rate per second
+    holding at most burst tokens, and for one of concurrency slots. The slots
+    shrink by half when a request is throttled or takes longer than
+    target_latency seconds and grow by one for every limit requests that do
+    not, up to max_concurrency. Requests that get a 429 or 5xx response or
+    cannot connect are retried up to retries times after a random delay of
+    up to backoff * 2^attempt seconds, or longer if the server asks with
+    Retry-After."""
+
+    def __init__(
+        self,
+        rate=10,
+        burst=10,
+        concurrency=4,
+        max_concurrency=8,
+        target_latency=30,
+        retries=5,
+        backoff=1,
+        max_backoff=60,
+        clock=monotonic,
+        sleep=sleep,
+        random=random,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.limit = concurrency
+        self.max_concurrency = max_concurrency
+        self.target_latency = target_latency
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.clock = clock
+        self.sleep = sleep
+        self.random = random
+        self.condition = Condition()
+        self.tokens = burst
+        self.updated = clock()
+        self.inflight = 0
+        self.retried = 0
+        self.throttled = 0
+
+    def take_token(self):
+        while True:
+            with self.condition:
+                now = self.clock()
+                self.tokens = min(
+                    self.burst, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            self.sleep(wait)
+
+    def acquire(self):
+        with self.condition:
+            while self.inflight >= int(self.limit):
+                self.condition.wait()
+            self.inflight += 1
+        self.take_token()
+
+    def release(self, latency, throttled):
+        with self.condition:
+            self.inflight -= 1
+            if throttled or latency > self.target_latency:
+                self.limit = max(1, self.limit / 2)
+            else:
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+            self.condition.notify_all()
+
+    def get_delay(self, attempt, retryafter=None):
+        delay = min(self.max_backoff, self.backoff * 2**attempt) * self.random()
+        if retryafter is not None:
+            delay = max(delay, retryafter)
+        return delay
+
+    def request(self, function, *args, **kwargs):
+        attempt = 0
+        while True:
+            if attempt:
+                rewind(kwargs.get("files"))
+            self.acquire()
+            start = self.clock()
+            try:
+                response = function(*args, **kwargs)
+            except (ConnectionError, Timeout) as e:
+                self.release(self.clock() - start, True)
+                if attempt == self.retries:
+                    raise
+                delay = self.get_delay(attempt)
+                logger.warning(f"Retrying HDX request in {delay:.1f}s after {e}")
+            else:
+                status = response.status_code
+                throttled = status in retry_statuses
+                self.release(self.clock() - start, throttled)
+                if not throttled or attempt == self.retries:
+                    return response
+                if status == 429:
+                    with self.condition:
+                        self.throttled += 1
+                delay = self.get_delay(attempt, get_retry_after(response))
+                logger.warning(f"Retrying HDX request in {delay:.1f}s after {status}")
+            with self.condition:
+                self.retried += 1
+            self.sleep(delay)
+            attempt += 1
+
+    def schedule_session(self, session):
+        for method in ("get", "post"):
+            setattr(session, method, partial(self.request, getattr(session, method)))
+
+    def schedule(self, configuration):
+        self.schedule_session(configuration.remoteckan().session)
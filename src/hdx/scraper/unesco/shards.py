@@ -0,0 +1,85 @@
+#!/usr/bin/python
+"""
+Shards:
+------
+
+Splits countries deterministically between runs on several nodes, balancing
+them by the size of their rows in the extracted files.
+
+"""
+
+import logging
+from datetime import date
+from uuid import NAMESPACE_URL, uuid5
+
+from hdx.scraper.unesco.index import build_index, load_index
+
+logger = logging.getLogger(__name__)
+
+
+def parse_shard(shard):
+    """Parses i/N where i is from 1 to N"""
+    try:
+        index, shards = (int(x) for x in shard.split("/"))
+    except ValueError:
+        raise ValueError(f"Shard {shard} is not of the form i/N!")
+    if shards < 1 or not 1 <= index <= shards:
+        raise ValueError(f"Shard {shard} must have i from 1 to N!")
+    return index, shards
+
+
+def get_country_volumes(datafiles):
+    volumes = dict()
+    for paths in datafiles.values():
+        for path in paths:
+            if not path:
+                continue
+            index = load_index(path)
+            if index is None:
+                index = build_index(path)
+            for countryiso, ranges in index["countries"].items():
+                volume = sum(end - start for _, start, end in ranges)
+                volumes[countryiso] = volumes.get(countryiso, 0) + volume
+    return volumes
+
+
+def assign_shards(countryisos, volumes, shards):
+    """Assigns each country, largest first, to the shard with the least volume
+    so far, then the fewest countries. Ties are broken by country code and
+    shard number so every node makes the same assignment."""
+    loads = [0] * shards
+    counts = [0] * shards
+    assignments = dict()
+    for countryiso in sorted(countryisos, key=lambda x: (-volumes.get(x, 0), x)):
+        shard = min(range(shards), key=lambda x: (loads[x], counts[x]))
+        assignments[countryiso] = shard + 1
+        loads[shard] += volumes.get(countryiso, 0)
+        counts[shard] += 1
+    return assignments
+
+
+def get_shard_countries(countries, datafiles, index, shards):
+    countryisos = [country["iso3"] for country in countries]
+    assignments = assign_shards(countryisos, get_country_volumes(datafiles), shards)
+    shardcountries = [
+        country for country in countries if assignments[country["iso3"]] == index
+    ]
+    logger.info(
+        f"Shard {index}/{shards} has {len(shardcountries)} of {len(countries)} countries"
+    )
+    return shardcountries
+
+
+def get_shard_batch(lookup, shards, runid=None, today=None):
+    """Batch id for shards not given one. It is derived from runid, such as
+    the CI run id that all of the shards' jobs share. Without it, it is derived
+    from the date, so shards started on either side of midnight get
+    different batch ids."""
+    if runid is None:
+        if today is None:
+            today = date.today()
+        runid = today.isoformat()
+        logger.warning(
+            f"No batch or run id given so using batch for {runid}. Shards started on another day will not share it!"
+        )
+    return str(uuid5(NAMESPACE_URL, f"{lookup} {shards} {runid}"))
@@ -0,0 +1,75 @@
+#!/usr/bin/python
+"""
+Snapshot:
+--------
+
+Fetches the organisation's existing datasets and showcases from HDX in a few
+paginated searches so that each country's dataset and showcase are compared
+against them instead of being read from HDX one at a time.
+
+"""
+
+import logging
+from threading import Lock
+
+from hdx.data.dataset import Dataset
+
+logger = logging.getLogger(__name__)
+
+
+class Snapshot:
+    """The datasets owned by organisation and the showcases whose names match
+    showcasename, fetched page_size at a time the first time one is needed.
+    Each is handed out once since it is out of date after being updated. Any
+    not found are read from HDX as usual. hdx-python-api has no public way to
+    update an object without reading it first, so use replaces the private
+    _load_from_hdx of the object. That is why the version of hdx-python-api
+    is pinned."""
+
+    def __init__(self, organisation, showcasename, configuration=None, page_size=100):
+        self.organisation = organisation
+        self.showcasename = showcasename
+        self.configuration = configuration
+        self.page_size = page_size
+        self.lock = Lock()
+        self.objects = None
+
+    def search(self, **kwargs):
+        # sorted by creation so that pages do not shift as datasets are updated
+        return Dataset.search_in_hdx(
+            configuration=self.configuration,
+            page_size=self.page_size,
+            sort="metadata_created asc",
+            **kwargs,
+        )
+
+    def fetch(self):
+        datasets = self.search(fq=f"owner_org:{self.organisation}")
+        showcases = self.search(
+            query=f"name:{self.showcasename}", fq="dataset_type:showcase"
+        )
+        logger.info(
+            f"Fetched {len(datasets)} datasets and {len(showcases)} showcases from HDX"
+        )
+        # search moves the resources out of data
+        return {x["name"]: x.get_dataset_dict() for x in datasets + showcases}
+
+    def pop(self, name):
+        with self.lock:
+            if self.objects is None:
+                self.objects = self.fetch()
+            return self.objects.pop(name, None)
+
+    def use(self, hdxobject):
+        """Makes hdxobject load itself from the snapshot rather than HDX"""
+        load_from_hdx = hdxobject._load_from_hdx
+
+        def load(object_type, id_field):
+            data = self.pop(id_field)
+            if data is None:
+                return load_from_hdx(object_type, id_field)
+            hdxobject._old_data = hdxobject.data
+            hdxobject.data = data
+            return True
+
+        hdxobject._load_from_hdx = load
@@ -0,0 +1,206 @@
+#!/usr/bin/python
+"""
+Workers:
+-------
+
+Generates country datasets and showcases in worker processes, returning
+serialisable payloads from which the parent process rebuilds them before
+creating them in HDX, optionally from upload threads fed by a bounded queue.
+
+"""
+
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from multiprocessing import get_context
+from os.path import getsize
+from queue import Full, Queue
+from threading import Event, Lock, Thread
+from time import perf_counter
+
+from hdx.data.dataset import Dataset
+from hdx.data.resource import Resource
+from hdx.data.showcase import Showcase
+from hdx.scraper.unesco.pipeline import generate_dataset_and_showcase
+from hdx.scraper.unesco.profiler import profile
+from hdx.scraper.unesco.releases import get_release, get_unchanged_sets
+
+logger = logging.getLogger(__name__)
+
+shared = dict()
+
+
+def init_worker(arguments):
+    shared.update(arguments)
+
+
+def get_payload(country, dataset, showcase, bites_disabled, qc_indicators):
+    if dataset is None:
+        return {"iso3": country["iso3"], "dataset": None}
+    resources = [
+        (resource.data, resource.get_file_to_upload())
+        for resource in dataset.get_resources()
+    ]
+    return {
+        "iso3": country["iso3"],
+        "dataset": dataset.data,
+        "resources": resources,
+        "showcase": showcase.data,
+        "bites_disabled": bites_disabled,
+        "qc_indicators": qc_indicators,
+    }
+
+
+def load_payload(payload):
+    if payload["dataset"] is None:
+        return None, None, None, None
+    dataset = Dataset(payload["dataset"])
+    for resourcedata, path in payload["resources"]:
+        resource = Resource(resourcedata)
+        resource.set_file_to_upload(path)
+        dataset.add_update_resource(resource)
+    showcase = Showcase(payload["showcase"])
+    return dataset, showcase, payload["bites_disabled"], payload["qc_indicators"]
+
+
+def get_bytes_read(countrydatafiles):
+    bytes_read = 0
+    for datafiles in countrydatafiles.values():
+        for datafile in datafiles:
+            if isinstance(datafile, dict):
+                if "blob" in datafile:
+                    start, end = datafile["blob"]
+                    bytes_read += end - start
+                    continue
+                for start, end in datafile["ranges"]:
+                    bytes_read += end - start
+    return bytes_read
+
+
+def generate_payload(country, folder):
+    start = perf_counter()
+    countryiso = country["iso3"]
+    countrydatafiles = shared["countriesdatafiles"].get(countryiso, dict())
+    digests = shared["pairdigests"].get(countryiso, dict())
+    unchanged = get_unchanged_sets(shared["releases"].get(countryiso), digests)
+    record = {"stage": "generate", "country": countryiso, "rows_kept": 0}
+    with profile(shared.get("profiler"), "generate", country=countryiso):
+        dataset, showcase, bites_disabled, qc_indicators = (
+            generate_dataset_and_showcase(
+                shared["indicatorsetcodes"],
+                shared["indheaders"],
+                shared["indicatorsetsindicators"],
+                shared["indicatorsetsdates"],
+                country,
+                countrydatafiles,
+                folder,
+                record,
+                unchanged,
+            )
+        )
+    payload = get_payload(country, dataset, showcase, bites_disabled, qc_indicators)
+    payload["release"] = get_release(
+        digests, payload.get("resources", ()), bites_disabled
+    )
+    record["bytes_read"] = get_bytes_read(countrydatafiles)
+    record["bytes_written"] = sum(
+        getsize(path) for _, path in payload.get("resources", ())
+    )
+    record["seconds"] = round(perf_counter() - start, 3)
+    payload["metrics"] = record
+    return payload
+
+
+def is_ready():
+    return True
+
+
+def get_executor(arguments, workers):
+    """Returns a pool of worker processes that have all been started, so it
+    must be called before any threads, such as the upload threads, are"""
+    if workers <= 1:
+        init_worker(arguments)
+        return None
+    # fork so that workers inherit the HDX configuration and the prepared
+    # data without pickling them
+    executor = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=get_context("fork"),
+        initializer=init_worker,
+        initargs=(arguments,),
+    )
+    # workers are forked on the first submit which would otherwise happen
+    # once the upload threads are running and may hold locks
+    executor.submit(is_ready).result()
+    return executor
+
+
+def submit_countries(executor, countries, folder, futures=None, limit=None):
+    """Submits countries until limit are in progress. countries should be an
+    iterator when limit is given so that later calls continue from where the
+    previous one stopped."""
+    if futures is None:
+        futures = dict()
+    if limit is not None:
+        countries = islice(countries, max(limit - len(futures), 0))
+    for country in countries:
+        futures[country["iso3"]] = executor.submit(generate_payload, country, folder)
+    return futures
+
+
+class UploadQueue:
+    """Runs an upload function for each country in background threads. put
+    blocks while the queue is full. After an upload fails, no further
+    countries are accepted, the uploads in progress are allowed to finish and
+    close raises the error."""
+
+    def __init__(self, function, uploaders, maxsize=None):
+        self.function = function
+        if maxsize is None:
+            maxsize = uploaders * 2
+        self.queue = Queue(maxsize)
+        self.failed = Event()
+        self.lock = Lock()
+        self.errors = list()
+        self.pending = list()
+        self.threads = [Thread(target=self.run) for _ in range(uploaders)]
+        for thread in self.threads:
+            thread.start()
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            countryiso, arguments = item
+            if self.failed.is_set():
+                continue
+            try:
+                self.function(countryiso, *arguments)
+            except Exception as e:
+                logger.exception(f"Upload of {countryiso} failed!")
+                with self.lock:
+                    self.errors.append(e)
+                self.failed.set()
+                continue
+            with self.lock:
+                self.pending.remove(countryiso)
+
+    def put(self, countryiso, *arguments):
+        with self.lock:
+            self.pending.append(countryiso)
+        while not self.failed.is_set():
+            try:
+                self.queue.put((countryiso, arguments), timeout=1)
+                return True
+            except Full:
+                continue
+        return False
+
+    def close(self):
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+        if self.errors:
+            raise self.errors[0]
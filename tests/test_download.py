@@ -0,0 +1,223 @@
+#!/usr/bin/python
+"""
+Unit tests for resumable downloading.
+
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha256
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from os import listdir, makedirs, stat
+from os.path import exists, join
+from threading import Thread
+
+import pytest
+
+from hdx.scraper.unesco.download import cached_urlretrieve, get_sha256, urlretrieve
+from hdx.utilities.path import temp_dir
+
+
+def get_sha256_bytes(content):
+    return sha256(content).hexdigest()
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    content = bytes(range(256)) * 400
+    # number of requests that are cut off half way through
+    failures = 0
+    ranges = list()
+    heads = 0
+
+    def get_etag(self):
+        return f'"{get_sha256_bytes(StandInHandler.content)}"'
+
+    def do_HEAD(self):
+        StandInHandler.heads += 1
+        etag = self.get_etag()
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+        else:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/zip")
+            self.send_header("Content-Length", str(len(StandInHandler.content)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+
+    def do_GET(self):
+        content = StandInHandler.content
+        total = len(content)
+        rangeheader = self.headers.get("Range")
+        StandInHandler.ranges.append(rangeheader)
+        if self.headers.get("If-Range") != self.get_etag():
+            # changed since the partial download so send all of it
+            rangeheader = None
+        if rangeheader:
+            start = int(rangeheader[6:-1])
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{total - 1}/{total}")
+        else:
+            start = 0
+            self.send_response(200)
+        self.send_header("Content-Type", "application/zip")
+        self.send_header("Content-Length", str(total - start))
+        self.send_header("ETag", self.get_etag())
+        self.end_headers()
+        body = content[start:]
+        if StandInHandler.failures:
+            StandInHandler.failures -= 1
+            body = body[: len(body) // 2]
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestDownload:
+    @pytest.fixture(scope="function")
+    def server(self):
+        StandInHandler.content = bytes(range(256)) * 400
+        StandInHandler.failures = 0
+        StandInHandler.ranges = list()
+        StandInHandler.heads = 0
+        server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+        thread = Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        yield f"http://127.0.0.1:{server.server_port}/SDG.zip"
+        server.shutdown()
+        server.server_close()
+
+    def test_urlretrieve(self, server):
+        with temp_dir("TestDownload") as folder:
+            path = join(folder, "SDG.zip")
+            result, headers = urlretrieve(server, path)
+            assert result == path
+            assert headers.get_content_type() == "application/zip"
+            with open(path, "rb") as f:
+                assert f.read() == StandInHandler.content
+            assert StandInHandler.ranges == [None]
+
+    def test_urlretrieve_resume(self, server):
+        with temp_dir("TestDownload") as folder:
+            StandInHandler.failures = 2
+            path = join(folder, "SDG.zip")
+            urlretrieve(server, path)
+            with open(path, "rb") as f:
+                assert f.read() == StandInHandler.content
+            assert StandInHandler.ranges == [None, "bytes=51200-", "bytes=76800-"]
+            assert not exists(f"{path}.part")
+
+            StandInHandler.failures = 3
+            StandInHandler.ranges = list()
+            with pytest.raises(OSError):
+                urlretrieve(server, path, retries=1)
+            assert exists(f"{path}.part")
+
+    def test_urlretrieve_changed(self, server):
+        with temp_dir("TestDownload") as folder:
+            StandInHandler.failures = 1
+            path = join(folder, "SDG.zip")
+            with pytest.raises(OSError):
+                urlretrieve(server, path, retries=0)
+            assert exists(f"{path}.part.json")
+
+            # the part file is from the old version so is not appended to
+            StandInHandler.content = bytes(range(128)) * 800
+            urlretrieve(server, path)
+            with open(path, "rb") as f:
+                assert f.read() == StandInHandler.content
+            assert StandInHandler.ranges == [None, "bytes=51200-"]
+            assert not exists(f"{path}.part.json")
+
+            # a part file without a validator is not resumed
+            with open(f"{path}.part", "wb") as f:
+                f.write(bytes(range(256)) * 10)
+            urlretrieve(server, path)
+            with open(path, "rb") as f:
+                assert f.read() == StandInHandler.content
+            assert StandInHandler.ranges == [None, "bytes=51200-", None]
+
+    def test_cached_urlretrieve(self, server):
+        with temp_dir("TestDownload") as folder:
+            cachefolder = join(folder, "cache")
+            path = join(folder, "run1", "SDG.zip")
+            makedirs(join(folder, "run1"))
+            makedirs(join(folder, "run2"))
+            _, headers = cached_urlretrieve(server, path, cachefolder)
+            assert headers.get_content_type() == "application/zip"
+            blobpath = join(
+                cachefolder, f"{get_sha256_bytes(StandInHandler.content)}.zip"
+            )
+            assert stat(path).st_ino == stat(blobpath).st_ino
+            assert StandInHandler.ranges == [None]
+            assert StandInHandler.heads == 0
+
+            path = join(folder, "run2", "SDG.zip")
+            _, headers = cached_urlretrieve(server, path, cachefolder)
+            assert headers.get_content_type() == "application/zip"
+            assert stat(path).st_ino == stat(blobpath).st_ino
+            assert StandInHandler.ranges == [None]
+            assert StandInHandler.heads == 1
+
+            StandInHandler.content = bytes(range(128)) * 10
+            cached_urlretrieve(server, path, cachefolder)
+            with open(path, "rb") as f:
+                assert f.read() == StandInHandler.content
+            assert StandInHandler.ranges == [None, None]
+            assert StandInHandler.heads == 2
+            assert not exists(blobpath)
+
+            # offline runs use the cached copy without asking the server
+            StandInHandler.content = bytes(range(64)) * 10
+            cached_urlretrieve(server, path, cachefolder, revalidate=False)
+            with open(path, "rb") as f:
+                assert f.read() == bytes(range(128)) * 10
+            assert StandInHandler.heads == 2
+
+    def test_cached_urlretrieve_shared(self, server):
+        with temp_dir("TestDownload") as folder:
+            cachefolder = join(folder, "cache")
+            othserver = server.replace("SDG.zip", "DEM.zip")
+            path = join(folder, "SDG.zip")
+            othpath = join(folder, "DEM.zip")
+            cached_urlretrieve(server, path, cachefolder)
+            cached_urlretrieve(othserver, othpath, cachefolder)
+            blobpath = join(
+                cachefolder, f"{get_sha256_bytes(StandInHandler.content)}.zip"
+            )
+            assert StandInHandler.ranges == [None, None]
+
+            StandInHandler.content = bytes(range(128)) * 10
+            cached_urlretrieve(server, path, cachefolder)
+            # still used by the other url
+            assert exists(blobpath)
+            cached_urlretrieve(othserver, othpath, cachefolder, revalidate=False)
+            with open(othpath, "rb") as f:
+                assert f.read() == bytes(range(256)) * 400
+            cached_urlretrieve(othserver, othpath, cachefolder)
+            assert not exists(blobpath)
+            assert StandInHandler.ranges == [None] * 4
+
+    def test_cached_urlretrieve_concurrent(self, server):
+        with temp_dir("TestDownload") as folder:
+            cachefolder = join(folder, "cache")
+            paths = [join(folder, f"SDG{i}.zip") for i in range(4)]
+
+            def retrieve(path):
+                return cached_urlretrieve(server, path, cachefolder)
+
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                list(executor.map(retrieve, paths))
+            for path in paths:
+                with open(path, "rb") as f:
+                    assert f.read() == StandInHandler.content
+            # the others waited for the first download and revalidated it
+            assert StandInHandler.ranges == [None]
+            assert StandInHandler.heads == 3
+            entries = [x for x in listdir(cachefolder) if x.endswith(".json")]
+            assert len(entries) == 1
+
+    def test_get_sha256(self):
+        assert (
+            get_sha256(join("tests", "fixtures", "NATMON.zip"))
+            == "586bd709bd46f3a7bb4ef3edd7434818fe40f7dfcad20cbeaf0c2f9ac6592b78"
+        )
@@ -0,0 +1,148 @@
+#!/usr/bin/python
+"""
+Unit tests for the byte offset index.
+
+"""
+
+from os import stat
+from os.path import exists, join
+from zipfile import ZipFile
+
+from hdx.scraper.unesco.index import (
+    build_index,
+    compact_datafile,
+    get_indexpath,
+    get_ranges,
+    get_rows,
+    load_index,
+)
+from hdx.scraper.unesco.pipeline import get_filepath
+from hdx.utilities.path import temp_dir
+
+
+class TestIndex:
+    data = (
+        "indicator_id,country_id,year,metadata\n"
+        "CR.1,AFG,2019,a\n"
+        "CR.1,AFG,2020,b\n"
+        "CR.1,ALB,2019,c\n"
+        'CR.2,AFG,2019,"multi\nline, quoted"\n'
+        "CR.2,ALB,2020,d\n"
+    )
+
+    def test_build_index(self):
+        with temp_dir("TestIndex") as folder:
+            path = join(folder, "DATA_NATIONAL.csv")
+            with open(path, "w", newline="") as f:
+                f.write(TestIndex.data)
+            source = {"crc": 1, "size": 2}
+            index = build_index(path, source)
+            assert exists(get_indexpath(path))
+            assert index["headers"] == [
+                "indicator_id",
+                "country_id",
+                "year",
+                "metadata",
+            ]
+            assert index["countries"] == {
+                "AFG": [["CR.1", 38, 70], ["CR.2", 86, 121]],
+                "ALB": [["CR.1", 70, 86], ["CR.2", 121, 137]],
+            }
+            assert index["counts"] == {"AFG": 3, "ALB": 2}
+            assert index["years"] == {"AFG": ["2019", "2020"], "ALB": ["2019", "2020"]}
+            assert load_index(path, source) == index
+            assert load_index(path, {"crc": 3, "size": 2}) is None
+            assert get_ranges(index, "AFG") == [[38, 70], [86, 121]]
+            assert get_ranges(index, "AFG", {"CR.2"}) == [[86, 121]]
+            assert get_ranges(index, "ZWE") == []
+            rows = list(get_rows(path, index["headers"], get_ranges(index, "AFG")))
+            assert [row["metadata"] for row in rows] == [
+                "a",
+                "b",
+                "multi\nline, quoted",
+            ]
+
+            def row_function(headers, row):
+                if row["year"] == "2020":
+                    return None
+                return row
+
+            rows = get_rows(path, index["headers"], [[38, 137]], row_function)
+            assert [row["metadata"] for row in rows] == [
+                "a",
+                "c",
+                "multi\nline, quoted",
+            ]
+
+            with open(path, "a") as f:
+                f.write("CR.2,ARM,2020,e\n")
+            assert load_index(path) is None
+
+    def test_build_index_blank_lines(self):
+        with temp_dir("TestIndex") as folder:
+            path = join(folder, "DATA_NATIONAL.csv")
+            with open(path, "w", newline="") as f:
+                f.write(TestIndex.data)
+            expected = build_index(path)
+            with open(path, "w", newline="") as f:
+                f.write(TestIndex.data.replace("CR.1,ALB", "\nCR.1,ALB"))
+                f.write("CR.3\n\n")
+            index = build_index(path)
+            assert index["rows"] == 5
+            assert index["counts"] == expected["counts"]
+            assert index["digests"] == expected["digests"]
+            assert index["countries"] == {
+                "AFG": [["CR.1", 38, 70], ["CR.2", 87, 122]],
+                "ALB": [["CR.1", 71, 87], ["CR.2", 122, 138]],
+            }
+            rows = list(get_rows(path, index["headers"], get_ranges(index, "ALB")))
+            assert [row["metadata"] for row in rows] == ["c", "d"]
+
+    def test_compact_datafile(self):
+        with temp_dir("TestIndex") as folder:
+            path = join(folder, "DATA_NATIONAL.csv")
+            with open(path, "w", newline="") as f:
+                f.write(TestIndex.data)
+            index = build_index(path)
+            headers = index["headers"]
+            expected = {
+                countryiso: (
+                    list(get_rows(path, headers, get_ranges(index, countryiso))),
+                    list(
+                        get_rows(path, headers, get_ranges(index, countryiso, {"CR.2"}))
+                    ),
+                )
+                for countryiso in ("AFG", "ALB")
+            }
+            blobpath = compact_datafile(path)
+            assert blobpath == f"{path}.z"
+            assert not exists(path)
+            assert not exists(get_indexpath(path))
+            blobindex = load_index(blobpath)
+            assert blobindex["counts"] == index["counts"]
+            assert blobindex["digests"] == index["digests"]
+            assert get_ranges(blobindex, "AFG") == [[0, 67]]
+            assert get_ranges(blobindex, "AFG", {"CR.2"}) == [[32, 67]]
+            assert get_ranges(blobindex, "ALB", {"CR.2"}) == [[16, 32]]
+            for countryiso, (rows, qcrows) in expected.items():
+                blob = blobindex["blobs"][countryiso]
+                ranges = get_ranges(blobindex, countryiso)
+                qcranges = get_ranges(blobindex, countryiso, {"CR.2"})
+                assert list(get_rows(blobpath, headers, ranges, blob=blob)) == rows
+                assert list(get_rows(blobpath, headers, qcranges, blob=blob)) == qcrows
+
+    def test_get_filepath(self):
+        with temp_dir("TestIndex") as folder:
+            with ZipFile(join("tests", "fixtures", "NATMON.zip")) as zipfile:
+                path = get_filepath(
+                    zipfile, "NATMON_DATA_NATIONAL.csv", folder, "NATMON"
+                )
+                assert path == join(folder, "NATMON", "NATMON_DATA_NATIONAL.csv")
+                mtime = stat(path).st_mtime_ns
+                index = load_index(path)
+                assert list(index["countries"].keys()) == ["AFG"]
+                assert (
+                    get_filepath(zipfile, "NATMON_DATA_NATIONAL.csv", folder, "NATMON")
+                    == path
+                )
+                assert stat(path).st_mtime_ns == mtime
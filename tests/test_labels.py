@@ -0,0 +1,31 @@
+#!/usr/bin/python
+"""
+Unit tests for the indicator label table.
+
+"""
+
+from hdx.scraper.unesco.labels import LabelTable, get_shortname
+
+
+class TestLabels:
+    def test_get_shortname(self):
+        assert (
+            get_shortname("Enrolment in  early childhood education, both sexes")
+            == "Enrolment in early childhood education"
+        )
+        assert get_shortname("Africa: Students from Ghana (number)") == "Africa"
+        assert get_shortname("Out-of-school rate\t(%)") == "Out-of-school rate"
+
+    def test_label_table(self):
+        headers = ["indicator_id", "indicator_label_en"]
+        labels = LabelTable(headers)
+        rows = [
+            {"indicator_id": "CR.1", "indicator_label_en": "Completion rate"},
+            {"indicator_id": "CR.2", "indicator_label_en": "Completion rate"},
+        ]
+        for row in rows:
+            labels.append(row)
+        assert len(labels) == 2
+        assert labels[1] == rows[1]
+        assert list(labels) == rows
+        assert labels.rows[0][1] is labels.rows[1][1]
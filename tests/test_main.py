@@ -0,0 +1,131 @@
+#!/usr/bin/python
+"""
+Unit tests for running the whole pipeline.
+
+"""
+
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from os import listdir, makedirs
+from os.path import exists, join
+from threading import Event, Thread
+from zipfile import ZipFile
+
+import pytest
+
+from hdx.api.configuration import Configuration
+from hdx.scraper.unesco import __main__ as unesco
+from hdx.scraper.unesco.metrics import Metrics
+from hdx.utilities.loader import load_text
+from hdx.utilities.path import temp_dir
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def make_zip(path):
+    """The fixture zip with the rows of Afghanistan copied to Albania and
+    Algeria"""
+    with ZipFile(join("tests", "fixtures", "NATMON.zip")) as inputzip:
+        with ZipFile(path, "w") as outputzip:
+            for filename in inputzip.namelist():
+                data = inputzip.read(filename)
+                if "DATA_NATIONAL" in filename or "METADATA" in filename:
+                    _, rows = data.split(b"\r\n", 1)
+                    for countryiso in (b"ALB", b"DZA"):
+                        data += rows.replace(b",AFG,", b"," + countryiso + b",")
+                outputzip.writestr(filename, data)
+
+
+class TestMain:
+    @pytest.fixture(scope="function")
+    def folder(self, monkeypatch):
+        Configuration._create(
+            hdx_read_only=True,
+            user_agent="test",
+            project_config_yaml=join("tests", "config", "project_configuration.yaml"),
+        )
+        configuration = Configuration.read()
+        configuration["indicatorsetcodes"] = {
+            "NATMON": configuration["indicatorsetcodes"]["NATMON"]
+        }
+        with temp_dir("TestMain") as folder:
+            monkeypatch.setenv("TEMP_DIR", folder)
+            monkeypatch.delenv("WHERETOSTART", raising=False)
+            yield folder
+
+    @pytest.fixture(scope="function")
+    def base_url(self, folder):
+        serverfolder = join(folder, "server")
+        makedirs(serverfolder)
+        make_zip(join(serverfolder, "NATMON.zip"))
+        handler = partial(QuietHandler, directory=serverfolder)
+        server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        thread = Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        yield f"http://127.0.0.1:{server.server_port}/"
+        server.shutdown()
+        server.server_close()
+
+    def run(self, base_url, offline_folder, metrics):
+        unesco.run(
+            base_url,
+            False,
+            None,
+            False,
+            2,
+            2,
+            metrics,
+            False,
+            offline_folder,
+            None,
+            None,
+        )
+
+    def test_run(self, folder, base_url, monkeypatch):
+        offline_folder = join(folder, "offline")
+        progressfolder = join(folder, unesco.lookup)
+        save_offline = unesco.save_offline
+        saved = list()
+        afgsaved = Event()
+
+        def failing_save_offline(countryfolder, *args):
+            countryiso = countryfolder[-3:]
+            if countryiso == "ALB":
+                # fail once Afghanistan has been saved in the other thread
+                afgsaved.wait(30)
+                raise ValueError("Disk is full!")
+            save_offline(countryfolder, *args)
+            saved.append(countryiso)
+            if countryiso == "AFG":
+                afgsaved.set()
+
+        monkeypatch.setattr(unesco, "save_offline", failing_save_offline)
+        metrics = Metrics()
+        with pytest.raises(ValueError):
+            self.run(base_url, offline_folder, metrics)
+        assert saved == ["AFG"]
+        assert listdir(offline_folder) == ["AFG"]
+        # a resumed run starts from the earliest country not saved
+        assert load_text(join(progressfolder, "progress.txt")) == "iso3=ALB"
+        generated = [x["country"] for x in metrics.records if x["stage"] == "generate"]
+        assert "AFG" in generated
+
+        def recording_save_offline(countryfolder, *args):
+            save_offline(countryfolder, *args)
+            saved.append(countryfolder[-3:])
+
+        monkeypatch.setattr(unesco, "save_offline", recording_save_offline)
+        metrics = Metrics()
+        self.run(base_url, offline_folder, metrics)
+        # saved in parallel by the upload threads
+        assert sorted(saved[1:]) == ["ALB", "DZA"]
+        generated = [x["country"] for x in metrics.records if x["stage"] == "generate"]
+        assert sorted(generated) == ["ALB", "DZA"]
+        assert sorted(listdir(offline_folder)) == ["AFG", "ALB", "DZA"]
+        for countryiso in ("AFG", "ALB", "DZA"):
+            assert exists(join(offline_folder, countryiso, "dataset.json"))
+        # deleted once the run succeeds
+        assert not exists(progressfolder)
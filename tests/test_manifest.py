@@ -0,0 +1,92 @@
+#!/usr/bin/python
+"""
+Unit tests for the country manifest.
+
+"""
+
+from os.path import join
+
+import pytest
+
+from hdx.api.configuration import Configuration
+from hdx.data.dataset import Dataset
+from hdx.data.resource import Resource
+from hdx.data.showcase import Showcase
+from hdx.scraper.unesco.manifest import (
+    get_country_hashes,
+    get_indicatorsetcode,
+    load_manifest,
+    save_manifest,
+)
+from hdx.utilities.path import temp_dir
+
+
+class TestManifest:
+    @pytest.fixture(scope="function")
+    def configuration(self):
+        Configuration._create(
+            hdx_read_only=True,
+            user_agent="test",
+            project_config_yaml=join("tests", "config", "project_configuration.yaml"),
+        )
+
+    @staticmethod
+    def get_dataset(folder, contents):
+        dataset = Dataset({"name": "unesco-data-for-afghanistan"})
+        for filename, content in contents.items():
+            path = join(folder, filename)
+            with open(path, "w") as f:
+                f.write(content)
+            resource = Resource({"name": filename, "format": "csv"})
+            resource.set_file_to_upload(path)
+            dataset.add_update_resource(resource)
+        return dataset
+
+    def test_get_indicatorsetcode(self):
+        assert get_indicatorsetcode("SDG_data_AFG.csv") == "SDG"
+        assert get_indicatorsetcode("qc_SDG_data_AFG.csv") == "SDG"
+        assert get_indicatorsetcode("DEM_metadata_AFG.csv") == "DEM"
+
+    def test_get_country_hashes(self, configuration):
+        with temp_dir("TestManifest") as folder:
+            contents = {
+                "SDG_data_AFG.csv": "a",
+                "qc_SDG_data_AFG.csv": "b",
+                "DEM_data_AFG.csv": "c",
+            }
+            showcase = Showcase({"name": "unesco-data-for-afghanistan-showcase"})
+            dataset = self.get_dataset(folder, contents)
+            hashes = get_country_hashes(dataset, showcase, [False], None)
+            assert sorted(hashes.keys()) == [
+                "DEM",
+                "SDG",
+                "metadata",
+                "quickcharts",
+                "resources",
+                "showcase",
+            ]
+            assert hashes == get_country_hashes(dataset, showcase, [False], None)
+            disabled = get_country_hashes(dataset, showcase, [True], None)
+            assert disabled["metadata"] != hashes["metadata"]
+            assert disabled["quickcharts"] != hashes["quickcharts"]
+            assert disabled["resources"] == hashes["resources"]
+            assert disabled["showcase"] == hashes["showcase"]
+
+            contents["DEM_data_AFG.csv"] = "d"
+            changed = get_country_hashes(
+                self.get_dataset(folder, contents), showcase, [False], None
+            )
+            assert changed["SDG"] == hashes["SDG"]
+            assert changed["DEM"] != hashes["DEM"]
+            assert changed["resources"] == hashes["resources"]
+            del contents["DEM_data_AFG.csv"]
+            removed = get_country_hashes(
+                self.get_dataset(folder, contents), showcase, [False], None
+            )
+            assert removed["resources"] != hashes["resources"]
+
+            path = join(folder, "manifest.json")
+            assert load_manifest(path) == dict()
+            assert load_manifest(None) == dict()
+            save_manifest({"AFG": hashes}, path)
+            assert load_manifest(path) == {"AFG": hashes}
@@ -0,0 +1,109 @@
+#!/usr/bin/python
+"""
+Unit tests for run metrics.
+
+"""
+
+from os import link, remove
+from os.path import exists, join
+from threading import Thread
+
+from hdx.scraper.unesco.metrics import (
+    Metrics,
+    get_folder_size,
+    get_prometheus_text,
+    measure,
+    save_metrics,
+)
+from hdx.utilities.loader import load_json
+from hdx.utilities.path import temp_dir
+from hdx.utilities.saver import save_text
+
+
+class TestMetrics:
+    def test_metrics(self):
+        class RemoteCKAN:
+            @staticmethod
+            def call_action(action, data=None, **kwargs):
+                return action
+
+        class Configuration:
+            remoteckan_object = RemoteCKAN()
+
+            def remoteckan(self):
+                return self.remoteckan_object
+
+        configuration = Configuration()
+        metrics = Metrics()
+        metrics.count_api_calls(configuration)
+        with measure(metrics, "extract", set="NATMON") as record:
+            record["rows_read"] = 10
+            record["bytes_written"] = 100
+        with measure(metrics, "extract", set="SDG") as record:
+            record["rows_read"] = 5
+        with measure(None, "extract") as record:
+            record["rows_read"] = 1
+
+        def upload(countryiso, calls):
+            with measure(metrics, "hdx", country=countryiso) as record:
+                api_calls = metrics.get_api_calls()
+                for _ in range(calls):
+                    configuration.remoteckan().call_action("package_show")
+                record["api_calls"] = metrics.get_api_calls() - api_calls
+
+        threads = [
+            Thread(target=upload, args=("AFG", 3)),
+            Thread(target=upload, args=("ALB", 2)),
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        summary = metrics.get_summary()
+        assert summary["api_calls"] == 5
+        stages = summary["stages"]
+        assert stages["extract"]["count"] == 2
+        assert stages["extract"]["rows_read"] == 15
+        assert stages["extract"]["bytes_written"] == 100
+        assert stages["hdx"]["api_calls"] == 5
+        assert {
+            record["country"]: record["api_calls"] for record in summary["slowest"]
+        } == {
+            "AFG": 3,
+            "ALB": 2,
+        }
+
+        with temp_dir("TestMetrics") as folder:
+            path = join(folder, "a.csv")
+            save_text("a" * 100, path)
+            link(path, join(folder, "b.csv"))
+            assert get_folder_size(folder) == 100
+            assert metrics.sample_disk(folder, folder) == 100
+            remove(path)
+            metrics.sample_disk(folder)
+            assert metrics.get_summary()["peak_disk_bytes"] == 100
+            save_metrics(metrics, folder)
+            assert load_json(join(folder, "metrics.json"))["api_calls"] == 5
+            path = join(folder, "unesco.prom")
+            assert not exists(f"{path}.tmp")
+            with open(path) as f:
+                text = f.read()
+            assert "unesco_api_calls 5\n" in text
+            assert "unesco_peak_disk_bytes 100\n" in text
+            assert 'unesco_stage_rows_read{stage="extract"} 15\n' in text
+            assert 'unesco_slowest_seconds{stage="hdx",country="AFG"}' in text
+            assert not exists(join(folder, "coverage.csv"))
+            metrics.coverage = {"AFG": {"SDG": 5, "DEM": 2}, "ALB": {"DEM": 3}}
+            save_metrics(metrics, folder)
+            with open(join(folder, "coverage.csv")) as f:
+                assert f.read() == "country_id,DEM,SDG,total\nAFG,2,5,7\nALB,3,0,3\n"
+
+    def test_prometheus_escaping(self):
+        metrics = Metrics()
+        with measure(metrics, 'ex"tract') as record:
+            record["rows_read"] = 1
+        with measure(metrics, "hdx", country="A\\F\nG"):
+            pass
+        text = get_prometheus_text(metrics.get_summary())
+        assert 'unesco_stage_rows_read{stage="ex\\"tract"} 1\n' in text
+        assert 'unesco_slowest_seconds{stage="hdx",country="A\\\\F\\nG"}' in text
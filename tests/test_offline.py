@@ -0,0 +1,100 @@
+#!/usr/bin/python
+"""
+Unit tests for offline builds.
+
+"""
+
+from os import listdir
+from os.path import exists, join
+
+import pytest
+
+from hdx.api.configuration import Configuration
+from hdx.data.dataset import Dataset
+from hdx.data.resource import Resource
+from hdx.data.showcase import Showcase
+from hdx.scraper.unesco.offline import formats, save_offline, setup_offline
+from hdx.scraper.unesco.pipeline import (
+    generate_dataset_and_showcase,
+    get_countriesdata,
+    partition_datafiles,
+    tags,
+)
+from hdx.utilities.loader import load_json
+from hdx.utilities.path import temp_dir
+
+
+class TestOffline:
+    @pytest.fixture(scope="function")
+    def configuration(self):
+        Configuration._create(
+            hdx_read_only=True,
+            user_agent="test",
+            project_config_yaml=join("tests", "config", "project_configuration.yaml"),
+        )
+        # so that a download of the formats would be attempted if not set up
+        Resource.set_formatsdict(None)
+        setup_offline()
+
+    def test_save_offline(self, configuration):
+        with temp_dir("TestOffline") as folder:
+            dataset = Dataset({"name": "unesco-data-for-zimbabwe"})
+            dataset.add_country_location("ZWE")
+            dataset.add_tags(list(tags))
+            path = join(folder, "SDG_data_ZWE.csv")
+            with open(path, "w") as f:
+                f.write("indicator_id,country_id,year,value\n")
+            resource = Resource({"name": "SDG data", "format": "csv"})
+            resource.set_file_to_upload(path)
+            dataset.add_update_resource(resource)
+            showcase = Showcase({"name": "unesco-data-for-zimbabwe-showcase"})
+            outputfolder = join(folder, "ZWE")
+            save_offline(outputfolder, dataset, showcase, None, None)
+            datasetdict = load_json(join(outputfolder, "dataset.json"))
+            assert datasetdict["groups"] == [{"name": "zwe"}]
+            assert len(datasetdict["tags"]) == len(tags)
+            assert datasetdict["resources"][0]["file"] == "SDG_data_ZWE.csv"
+            assert exists(join(outputfolder, "SDG_data_ZWE.csv"))
+            assert load_json(join(outputfolder, "showcase.json")) == showcase.data
+
+    def test_generate_offline(self, configuration):
+        indicatorsetcodes = {
+            "NATMON": Configuration.read()["indicatorsetcodes"]["NATMON"]
+        }
+        indicatorsets = {"NATMON": join("tests", "fixtures", "NATMON.zip")}
+        with temp_dir("TestOffline") as folder:
+            (
+                countries,
+                indheaders,
+                indicatorsetsindicators,
+                indicatorsetsdates,
+                datafiles,
+                _,
+            ) = get_countriesdata(indicatorsets, folder)
+            countriesdatafiles = partition_datafiles(datafiles, indicatorsetcodes)
+            dataset, showcase, bites_disabled, qc_indicators = (
+                generate_dataset_and_showcase(
+                    indicatorsetcodes,
+                    indheaders,
+                    indicatorsetsindicators,
+                    indicatorsetsdates,
+                    countries[0],
+                    countriesdatafiles["AFG"],
+                    folder,
+                )
+            )
+            outputfolder = join(folder, "AFG")
+            save_offline(outputfolder, dataset, showcase, bites_disabled, qc_indicators)
+            # the formats were not downloaded
+            assert Resource._formats_dict == {x: x for x in formats}
+            datasetdict = load_json(join(outputfolder, "dataset.json"))
+            assert [x["format"] for x in datasetdict["resources"]] == ["csv"] * 4
+            assert sorted(listdir(outputfolder)) == [
+                "NATMON_data_AFG.csv",
+                "NATMON_indicatorlist_AFG.csv",
+                "NATMON_metadata_AFG.csv",
+                "dataset.json",
+                "qc_NATMON_data_AFG.csv",
+                "quickcharts.json",
+                "showcase.json",
+            ]
@@ -0,0 +1,55 @@
+#!/usr/bin/python
+"""
+Unit tests for the profiler.
+
+"""
+
+import pstats
+import tracemalloc
+from os import listdir
+from os.path import join
+
+from hdx.scraper.unesco.metrics import Metrics, measure
+from hdx.scraper.unesco.profiler import Profiler, profile
+from hdx.utilities.path import temp_dir
+
+
+def make_rows(n):
+    return [[str(i)] * 10 for i in range(n)]
+
+
+class TestProfiler:
+    def test_profile(self):
+        with temp_dir("TestProfiler") as folder:
+            metrics = Metrics(Profiler(folder))
+            with measure(metrics, "get_countriesdata"):
+                # included in the outer stage
+                with measure(metrics, "extract", set="SDG"):
+                    make_rows(1000)
+            with measure(metrics, "hdx", country="AFG"):
+                make_rows(10)
+            assert sorted(listdir(folder)) == [
+                "get_countriesdata.pstats",
+                "get_countriesdata.txt",
+            ]
+            assert not tracemalloc.is_tracing()
+            stats = pstats.Stats(join(folder, "get_countriesdata.pstats"))
+            functions = [function for _, _, function in stats.stats]
+            assert "make_rows" in functions
+            with open(join(folder, "get_countriesdata.txt")) as f:
+                text = f.read()
+            assert "Ordered by: cumulative time" in text
+            assert "Peak traced memory" in text
+            assert "test_profiler.py:" in text
+            assert [record["stage"] for record in metrics.records] == [
+                "extract",
+                "get_countriesdata",
+                "hdx",
+            ]
+
+            with profile(Profiler(folder, countries=True), "hdx", country="AFG"):
+                make_rows(10)
+            assert "hdx-AFG.pstats" in listdir(folder)
+            with profile(None, "hdx", country="ALB"):
+                make_rows(10)
+            assert "hdx-ALB.pstats" not in listdir(folder)
@@ -0,0 +1,86 @@
+#!/usr/bin/python
+"""
+Unit tests for release digests.
+
+"""
+
+from hdx.scraper.unesco.releases import (
+    get_pair_digests,
+    get_release,
+    get_unchanged_sets,
+    is_unchanged,
+)
+
+
+class TestReleases:
+    def test_releases(self):
+        indicatorsetcodes = {
+            "DEM": {"title": "Demographic and Socio-economic"},
+            "SDG": {"title": "SDG 4 Global and Thematic"},
+        }
+        indicatorsetsindicators = {
+            "DEM": {"shortnames": {"Population"}},
+            "SDG": {"shortnames": {"Completion rate"}},
+        }
+        indicatorsetsdates = {"DEM": "2020 September", "SDG": "2020 September"}
+        headers = ["indicator_id", "country_id", "year", "value"]
+        countriesdatafiles = {
+            "AFG": {
+                "DEM": (None, {"headers": headers, "digest": "a"}),
+                "SDG": ({"digest": "b"}, {"headers": headers, "digest": "c"}),
+            },
+            "ALB": {"DEM": (None, {"headers": headers, "digest": "d"})},
+        }
+        digests = get_pair_digests(
+            indicatorsetcodes,
+            indicatorsetsindicators,
+            indicatorsetsdates,
+            countriesdatafiles,
+        )
+        assert list(digests["AFG"].keys()) == ["DEM", "SDG"]
+        assert list(digests["ALB"].keys()) == ["DEM"]
+        assert digests["AFG"]["DEM"] != digests["ALB"]["DEM"]
+        assert (
+            get_pair_digests(
+                indicatorsetcodes,
+                indicatorsetsindicators,
+                indicatorsetsdates,
+                countriesdatafiles,
+                "1.0.1",
+            )["AFG"]["DEM"]
+            != digests["AFG"]["DEM"]
+        )
+
+        resources = [
+            ({"name": "DEM data"}, "/tmp/DEM/DEM_data_AFG.csv"),
+            ({"name": "SDG data"}, "/tmp/SDG/SDG_data_AFG.csv"),
+            ({"name": "QuickCharts-SDG data"}, "/tmp/SDG/qc_SDG_data_AFG.csv"),
+        ]
+        release = get_release(digests["AFG"], resources, [False, True, False])
+        assert release == {
+            "DEM": {
+                "digest": digests["AFG"]["DEM"],
+                "resources": [[{"name": "DEM data"}, "DEM_data_AFG.csv"]],
+            },
+            "SDG": {
+                "digest": digests["AFG"]["SDG"],
+                "resources": [
+                    [{"name": "SDG data"}, "SDG_data_AFG.csv"],
+                    [{"name": "QuickCharts-SDG data"}, "qc_SDG_data_AFG.csv"],
+                ],
+                "bites_disabled": [False, True, False],
+            },
+        }
+        assert is_unchanged(release, digests["AFG"]) is True
+        assert is_unchanged(None, digests["AFG"]) is False
+
+        # UIS republishes only DEM
+        indicatorsetsdates["DEM"] = "2021 February"
+        newdigests = get_pair_digests(
+            indicatorsetcodes,
+            indicatorsetsindicators,
+            indicatorsetsdates,
+            countriesdatafiles,
+        )
+        assert is_unchanged(release, newdigests["AFG"]) is False
+        assert list(get_unchanged_sets(release, newdigests["AFG"]).keys()) == ["SDG"]
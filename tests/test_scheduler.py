@@ -0,0 +1,111 @@
+#!/usr/bin/python
+"""
+Unit tests for the HDX request scheduler.
+
+"""
+
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from threading import Thread
+from time import sleep
+
+import pytest
+from ckanapi import RemoteCKAN
+from requests import Session
+
+from hdx.scraper.unesco.scheduler import Scheduler
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    # statuses to return before succeeding
+    statuses = list()
+    latency = 0
+    bodies = list()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        StandInHandler.bodies.append(self.rfile.read(length))
+        sleep(StandInHandler.latency)
+        if StandInHandler.statuses:
+            status = StandInHandler.statuses.pop(0)
+            self.send_response(status)
+            if status == 429:
+                self.send_header("Retry-After", "0")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = json.dumps({"success": True, "result": {"name": "unesco"}})
+        body = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestScheduler:
+    @pytest.fixture(scope="function")
+    def remoteckan(self):
+        StandInHandler.statuses = list()
+        StandInHandler.latency = 0
+        StandInHandler.bodies = list()
+        server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+        thread = Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        yield RemoteCKAN(f"http://127.0.0.1:{server.server_port}", session=Session())
+        server.shutdown()
+        server.server_close()
+
+    def test_retry(self, remoteckan):
+        delays = list()
+        scheduler = Scheduler(backoff=0.01, sleep=delays.append)
+        scheduler.schedule_session(remoteckan.session)
+        StandInHandler.statuses = [429, 503, 502]
+        files = {"upload": ("SDG_data_AFG.csv", BytesIO(b"indicator_id\n"))}
+        result = remoteckan.call_action("resource_create", {"id": "x"}, files=files)
+        assert result == {"name": "unesco"}
+        assert scheduler.retried == 3
+        assert scheduler.throttled == 1
+        assert len(delays) == 3
+        assert all(delay <= 0.01 * 2**i for i, delay in enumerate(delays))
+        # the file is sent again in full on each retry
+        assert len({len(body) for body in StandInHandler.bodies}) == 1
+        # halved three times to 1 then grown by the success
+        assert scheduler.limit == 2
+
+        StandInHandler.statuses = [500] * 6
+        with pytest.raises(Exception):
+            remoteckan.call_action("package_show", {"id": "x"})
+        assert scheduler.retried == 8
+
+    def test_adapt(self, remoteckan):
+        clock = [0]
+
+        def sleep(seconds):
+            clock[0] += seconds
+
+        scheduler = Scheduler(
+            rate=2,
+            burst=1,
+            concurrency=2,
+            max_concurrency=4,
+            target_latency=0.05,
+            clock=lambda: clock[0],
+            sleep=sleep,
+        )
+        scheduler.schedule_session(remoteckan.session)
+        for _ in range(3):
+            remoteckan.call_action("package_show", {"id": "x"})
+        # two requests waited half a second for a token
+        assert clock[0] == 1
+        assert scheduler.limit > 2
+        StandInHandler.latency = 0.1
+        scheduler.clock = lambda: clock[0] + StandInHandler.latency * len(
+            StandInHandler.bodies
+        )
+        remoteckan.call_action("package_show", {"id": "x"})
+        assert scheduler.limit < 2
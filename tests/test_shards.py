@@ -0,0 +1,76 @@
+#!/usr/bin/python
+"""
+Unit tests for country shards.
+
+"""
+
+from datetime import date
+from os.path import join
+
+import pytest
+
+from hdx.scraper.unesco.shards import (
+    assign_shards,
+    get_country_volumes,
+    get_shard_batch,
+    get_shard_countries,
+    parse_shard,
+)
+from hdx.utilities.path import temp_dir
+
+
+class TestShards:
+    def test_parse_shard(self):
+        assert parse_shard("2/4") == (2, 4)
+        with pytest.raises(ValueError):
+            parse_shard("0/4")
+        with pytest.raises(ValueError):
+            parse_shard("5/4")
+        with pytest.raises(ValueError):
+            parse_shard("2")
+
+    def test_assign_shards(self):
+        volumes = {"AFG": 10, "ALB": 7, "DZA": 5, "AGO": 3, "ARG": 2, "ARM": 1}
+        assignments = assign_shards(sorted(volumes), volumes, 2)
+        assert assignments == {
+            "AFG": 1,
+            "ALB": 2,
+            "DZA": 2,
+            "AGO": 1,
+            "ARG": 2,
+            "ARM": 1,
+        }
+        assert assign_shards(reversed(sorted(volumes)), volumes, 2) == assignments
+        loads = [0, 0]
+        for countryiso, shard in assignments.items():
+            loads[shard - 1] += volumes[countryiso]
+        assert loads == [14, 14]
+        assert set(assign_shards(["AFG", "ZWE"], dict(), 3).values()) == {1, 2}
+
+    def test_get_shard_countries(self):
+        with temp_dir("TestShards") as folder:
+            path = join(folder, "DATA_NATIONAL.csv")
+            with open(path, "w", newline="") as f:
+                f.write(
+                    "indicator_id,country_id,year,value\n"
+                    "CR.1,AFG,2019,1\n"
+                    "CR.1,AFG,2020,2\n"
+                    "CR.1,ALB,2019,3\n"
+                    "CR.1,DZA,2019,4\n"
+                )
+            datafiles = {"SDG": (None, path)}
+            assert get_country_volumes(datafiles) == {"AFG": 32, "ALB": 16, "DZA": 16}
+            countries = [{"iso3": "AFG"}, {"iso3": "ALB"}, {"iso3": "DZA"}]
+            shard1 = get_shard_countries(countries, datafiles, 1, 2)
+            shard2 = get_shard_countries(countries, datafiles, 2, 2)
+            assert shard1 == [{"iso3": "AFG"}]
+            assert shard2 == [{"iso3": "ALB"}, {"iso3": "DZA"}]
+
+    def test_get_shard_batch(self):
+        batch = get_shard_batch("hdx-scraper-unesco", 4, "12345")
+        # shards started on different days in the same run
+        assert batch == get_shard_batch("hdx-scraper-unesco", 4, "12345")
+        assert batch != get_shard_batch("hdx-scraper-unesco", 4, "12346")
+        batch = get_shard_batch("hdx-scraper-unesco", 4, today=date(2025, 3, 3))
+        assert batch == get_shard_batch("hdx-scraper-unesco", 4, today=date(2025, 3, 3))
+        assert batch != get_shard_batch("hdx-scraper-unesco", 4, today=date(2025, 3, 4))
@@ -0,0 +1,165 @@
+#!/usr/bin/python
+"""
+Unit tests for the snapshot of existing datasets and showcases.
+
+"""
+
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from os.path import join
+from threading import Thread
+from urllib.parse import parse_qs
+
+import pytest
+from ckanapi import RemoteCKAN
+from requests import Session
+
+from hdx.api.configuration import Configuration
+from hdx.data.dataset import Dataset
+from hdx.data.resource import Resource
+from hdx.data.showcase import Showcase
+from hdx.scraper.unesco.offline import setup_offline
+from hdx.scraper.unesco.snapshot import Snapshot
+
+datasets = [
+    {
+        "id": f"{i}",
+        "name": f"unesco-data-for-{name}",
+        "resources": [
+            {"id": f"{i}-{code}", "name": f"{code} data", "format": "csv"}
+            for code in ("SDG", "DEM")
+        ],
+    }
+    for i, name in enumerate(("afghanistan", "albania", "algeria"))
+]
+showcases = [
+    {
+        "id": "10",
+        "name": "unesco-data-for-afghanistan-showcase",
+        "type": "showcase",
+        "title": "Afghanistan",
+        "notes": "Education indicators for Afghanistan",
+        "url": "https://uis.unesco.org",
+        "image_url": "https://uis.unesco.org/logo.png",
+        "tags": [{"name": "education"}],
+    }
+]
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    actions = list()
+
+    def do_POST(self):
+        action = self.path.split("/")[-1]
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length).decode("utf-8")
+        if self.headers.get("Content-Type") == "application/json":
+            data = json.loads(body)
+        else:
+            data = {key: value[0] for key, value in parse_qs(body).items()}
+        StandInHandler.actions.append(action)
+        if action == "package_search":
+            if "showcase" in data["fq"]:
+                results = showcases
+            else:
+                results = datasets
+            start = int(data.get("start", 0))
+            rows = int(data["rows"])
+            result = {"count": len(results), "results": results[start : start + rows]}
+        elif action == "ckanext_showcase_update":
+            result = data
+        elif action == "package_revise":
+            result = json.loads(data["update"])
+            result.update(json.loads(data["match"]))
+            result = {"package": result}
+        else:
+            result = None
+        if result is None:
+            status = 404
+            response = {"success": False, "error": {"__type": "Not Found Error"}}
+        else:
+            status = 200
+            response = {"success": True, "result": result}
+        body = json.dumps(response).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestSnapshot:
+    @pytest.fixture(scope="function")
+    def configuration(self):
+        StandInHandler.actions = list()
+        server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+        thread = Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        Configuration._create(
+            hdx_read_only=True,
+            user_agent="test",
+            project_config_yaml=join("tests", "config", "project_configuration.yaml"),
+            remoteckan=RemoteCKAN(
+                f"http://127.0.0.1:{server.server_port}", session=Session()
+            ),
+        )
+        # approved tags without reading them from HDX
+        setup_offline()
+        yield Configuration.read()
+        server.shutdown()
+        server.server_close()
+
+    def test_snapshot(self, configuration):
+        snapshot = Snapshot("unesco", "unesco-data-for-*-showcase", page_size=2)
+        assert StandInHandler.actions == list()
+        dataset = Dataset({"name": "unesco-data-for-albania", "title": "Albania"})
+        snapshot.use(dataset)
+        assert dataset._dataset_load_from_hdx("unesco-data-for-albania") is True
+        assert dataset["id"] == "1"
+        # resources are there to be matched and compared by hash
+        assert [x["id"] for x in dataset.get_resources()] == ["1-SDG", "1-DEM"]
+        # two pages of datasets and one of showcases
+        assert StandInHandler.actions == ["package_search"] * 3
+
+        showcase = Showcase(
+            {"name": "unesco-data-for-afghanistan-showcase", "title": "AFG"}
+        )
+        snapshot.use(showcase)
+        showcase.create_in_hdx()
+        assert showcase["id"] == "10"
+        assert showcase["title"] == "AFG"
+        assert StandInHandler.actions[3:] == ["ckanext_showcase_update"]
+
+        # handed out only once and otherwise read from HDX
+        dataset = Dataset({"name": "unesco-data-for-albania"})
+        snapshot.use(dataset)
+        assert dataset._dataset_load_from_hdx("unesco-data-for-albania") is False
+        assert StandInHandler.actions[4:] == ["package_show"]
+
+    def test_snapshot_hooks(self, configuration):
+        # Snapshot relies on the private _load_from_hdx and _old_data of the
+        # pinned hdx-python-api so this fails if they change
+        snapshot = Snapshot("unesco", "unesco-data-for-*-showcase")
+        dataset = Dataset({"name": "unesco-data-for-albania", "title": "Albania"})
+        for code in ("SDG", "DEM"):
+            resource = Resource({"name": f"{code} data", "description": code})
+            resource.set_format("csv")
+            resource["url"] = f"https://uis.unesco.org/{code}.csv"
+            dataset.add_update_resource(resource)
+        snapshot.use(dataset)
+        dataset.create_in_hdx(
+            match_resources_by_metadata=False,
+            remove_additional_resources=True,
+            match_resource_order=True,
+            create_default_views=False,
+            hxl_update=False,
+            batch="6b2e5c68-1c4e-4a0e-9d0b-0d5ab2ec6a11",
+            ignore_check=True,
+        )
+        # updated from the snapshot without being read from HDX
+        assert StandInHandler.actions == ["package_search"] * 2 + ["package_revise"]
+        assert dataset["id"] == "1"
+        assert dataset.get_old_data_dict()["id"] == "1"
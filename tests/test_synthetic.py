@@ -0,0 +1,53 @@
+#!/usr/bin/python
+"""
+Unit tests for the synthetic bulk zip generator.
+
+"""
+
+from os.path import join
+
+from benchmarks.synthetic import generate_bulk_zip
+
+from hdx.location.country import Country
+from hdx.scraper.unesco.index import get_rows
+from hdx.scraper.unesco.pipeline import get_countriesdata, partition_datafiles
+from hdx.utilities.path import temp_dir
+
+
+class TestSynthetic:
+    def test_generate_bulk_zip(self):
+        Country.countriesdata(use_live=False)
+        with temp_dir("TestSynthetic") as folder:
+            path = join(folder, "NATMON.zip")
+            counts = generate_bulk_zip(
+                path,
+                countries=5,
+                indicators=10,
+                years=8,
+                extra_indicators=["CR.1"],
+            )
+            assert sum(counts["countryrows"].values()) == counts["rows"]
+            (
+                countries,
+                indheaders,
+                indicatorsetsindicators,
+                indicatorsetsdates,
+                datafiles,
+                coverage,
+            ) = get_countriesdata({"NATMON": path}, folder)
+            countryrows = counts["countryrows"]
+            assert [country["iso3"] for country in countries] == sorted(
+                countryrows, key=lambda x: (-countryrows[x], x)
+            )
+            assert coverage == {x: {"NATMON": rows} for x, rows in countryrows.items()}
+            assert indheaders == ["indicator_id", "indicator_label_en"]
+            assert len(indicatorsetsindicators["NATMON"]["rows"]) == 10
+            assert indicatorsetsdates == {"NATMON": "2020 September"}
+            countriesdatafiles = partition_datafiles(datafiles)
+            for countryiso, rows in counts["countryrows"].items():
+                _, datafile = countriesdatafiles[countryiso]["NATMON"]
+                countryrows = list(
+                    get_rows(datafile["path"], datafile["headers"], datafile["ranges"])
+                )
+                assert len(countryrows) == rows
+                assert {row["country_id"] for row in countryrows} == {countryiso}
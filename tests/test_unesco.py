@@ -5,27 +5,52 @@ Unit tests for UNESCO.
 """
 
 import os
-from os.path import join
+from csv import DictReader
+from hashlib import sha256
+from os.path import exists, join, samefile
+from shutil import copyfile
 
 import pytest
 
 from hdx.api.configuration import Configuration
 from hdx.api.locations import Locations
+from hdx.data.dataset import Dataset
 from hdx.data.vocabulary import Vocabulary
 from hdx.location.country import Country
+from hdx.scraper.unesco.index import compact_datafile, get_rows
+from hdx.scraper.unesco.metrics import Metrics
 from hdx.scraper.unesco.pipeline import (
     download_indicatorsets,
+    generate_country_resource,
     generate_dataset_and_showcase,
     get_countriesdata,
+    get_year_range,
+    partition_datafiles,
+)
+from hdx.scraper.unesco.releases import get_pair_digests
+from hdx.scraper.unesco.workers import (
+    generate_payload,
+    get_bytes_read,
+    get_executor,
+    load_payload,
+    submit_countries,
 )
 from hdx.utilities.compare import assert_files_same
-from hdx.utilities.downloader import Download
+from hdx.utilities.loader import load_json
 from hdx.utilities.path import temp_dir
 
 
 class TestUNESCO:
     headers = ["indicator_id", "COUNTRY_ID", "YEAR", "VALUE", "MAGNITUDE", "QUALIFIER"]
     indheaders = ["indicator_id", "indicator_label_en"]
+    dataheaders = [
+        "indicator_id",
+        "country_id",
+        "year",
+        "value",
+        "magnitude",
+        "qualifier",
+    ]
 
     @pytest.fixture(scope="function")
     def configuration(self):
@@ -65,6 +90,7 @@ class TestUNESCO:
                 def get_content_type():
                     return "application/zip"
 
+            copyfile(join("tests", "fixtures", "NATMON.zip"), path)
             return path, Headers()
 
         return myurlretrieve
@@ -83,237 +109,509 @@ class TestUNESCO:
                 "NATMON": join(folder, "NATMON.zip"),
                 "SDG": join(folder, "SDG.zip"),
             }
+            assert load_json(join(folder, "SDG.json")) == {
+                "size": 59939,
+                "sha256": "586bd709bd46f3a7bb4ef3edd7434818fe40f7dfcad20cbeaf0c2f9ac6592b78",
+            }
+
+            def failing_urlretrieve(url, path):
+                raise AssertionError(f"{url} should not be downloaded again!")
+
+            result = download_indicatorsets(
+                configuration["base_url"],
+                folder,
+                configuration["indicatorsetcodes"],
+                urlretrieve=failing_urlretrieve,
+            )
+            assert result["SDG"] == join(folder, "SDG.zip")
+            with open(join(folder, "SDG.zip"), "ab") as f:
+                f.write(b"corrupt")
+            with pytest.raises(AssertionError):
+                download_indicatorsets(
+                    configuration["base_url"],
+                    folder,
+                    configuration["indicatorsetcodes"],
+                    urlretrieve=failing_urlretrieve,
+                )
 
     def test_get_countriesdata(self):
         indicatorsets = {"NATMON": join("tests", "fixtures", "NATMON.zip")}
         with temp_dir("TestUNESCO") as folder:
-            with Download(user_agent="test") as downloader:
-                result = get_countriesdata(indicatorsets, downloader, folder)
-                (
-                    countries,
-                    indheaders,
-                    indicatorsetsindicators,
-                    indicatorsetsdates,
-                    datafiles,
-                ) = result
-                assert len(countries) == 238
-                assert countries[9] == {
-                    "countryname": "Armenia",
-                    "iso2": "AM",
-                    "iso3": "ARM",
-                }
-                assert indheaders == TestUNESCO.indheaders
-                assert indicatorsets == {"NATMON": "tests/fixtures/NATMON.zip"}
-                assert len(indicatorsetsindicators["NATMON"]["rows"]) == 1055
-                assert indicatorsetsindicators["NATMON"]["rows"][80] == {
-                    "indicator_id": "26442",
-                    "indicator_label_en": "Africa: Students from Ghana, both sexes (number)",
-                }
-                assert len(indicatorsetsindicators["NATMON"]["shortnames"]) == 246
-                assert (
-                    sorted(indicatorsetsindicators["NATMON"]["shortnames"])[40]
-                    == "Enrolment in early childhood education"
+            result = get_countriesdata(indicatorsets, folder)
+            (
+                countries,
+                indheaders,
+                indicatorsetsindicators,
+                indicatorsetsdates,
+                datafiles,
+                coverage,
+            ) = result
+            # only Afghanistan of the 238 countries has data in the fixture
+            assert countries == [
+                {"iso3": "AFG", "iso2": "AF", "countryname": "Afghanistan"}
+            ]
+            assert coverage == {"AFG": {"NATMON": 9390}}
+            assert indheaders == TestUNESCO.indheaders
+            assert indicatorsets == {"NATMON": "tests/fixtures/NATMON.zip"}
+            assert len(indicatorsetsindicators["NATMON"]["rows"]) == 1055
+            assert indicatorsetsindicators["NATMON"]["rows"][80] == {
+                "indicator_id": "26442",
+                "indicator_label_en": "Africa: Students from Ghana, both sexes (number)",
+            }
+            assert len(indicatorsetsindicators["NATMON"]["shortnames"]) == 246
+            assert (
+                sorted(indicatorsetsindicators["NATMON"]["shortnames"])[40]
+                == "Enrolment in early childhood education"
+            )
+            indicatorlistpath = join(folder, "NATMON", "NATMON_indicatorlist.csv")
+            assert indicatorsetsindicators["NATMON"]["path"] == indicatorlistpath
+            with open(indicatorlistpath) as f:
+                assert f.readline() == "indicator_id,indicator_label_en\n"
+                assert f.readline() == "#indicator+code,#indicator+name\n"
+                assert len(f.readlines()) == 1055
+            assert indicatorsetsindicators["NATMON"]["names"] == ", ".join(
+                sorted(indicatorsetsindicators["NATMON"]["shortnames"])
+            )
+            assert indicatorsetsdates == {"NATMON": "2020 September"}
+            assert datafiles == {
+                "NATMON": (
+                    join(os.sep, "tmp", "TestUNESCO", "NATMON", "NATMON_METADATA.csv"),
+                    join(
+                        os.sep,
+                        "tmp",
+                        "TestUNESCO",
+                        "NATMON",
+                        "NATMON_DATA_NATIONAL.csv",
+                    ),
+                )
+            }
+
+    def test_get_countriesdata_low_disk(self):
+        peaks = list()
+        for low_disk in (False, True):
+            with temp_dir("TestUNESCO") as folder:
+                indicatorsets = dict()
+                for indicatorsetcode in ("NATMON", "SDG"):
+                    path = join(folder, f"{indicatorsetcode}.zip")
+                    copyfile(join("tests", "fixtures", "NATMON.zip"), path)
+                    indicatorsets[indicatorsetcode] = path
+                metrics = Metrics()
+                result = get_countriesdata(indicatorsets, folder, metrics, low_disk)
+                metrics.sample_disk(folder)
+                peaks.append(metrics.peakdisk)
+                datafiles = result[4]
+                assert result[5] == {"AFG": {"NATMON": 9390, "SDG": 9390}}
+                for path in indicatorsets.values():
+                    assert exists(path) is not low_disk
+                for metadatapath, datapath in datafiles.values():
+                    assert metadatapath.endswith(".z") is low_disk
+                    assert datapath.endswith(".z") is low_disk
+                    countriesdatafiles = partition_datafiles({"SDG": (None, datapath)})
+                    assert countriesdatafiles["AFG"]["SDG"][1]["years"][-1] == "2020"
+        # only one set's csvs are on disk at a time
+        assert peaks[1] < peaks[0]
+
+    def test_partition_datafiles(self):
+        with temp_dir("TestUNESCO") as folder:
+            metadatapath = join(folder, "NATMON_METADATA.csv")
+            copyfile(join("tests", "fixtures", "NATMON_METADATA.csv"), metadatapath)
+            datapath = join(folder, "NATMON_DATA_NATIONAL.csv")
+            copyfile(join("tests", "fixtures", "NATMON_DATA_NATIONAL.csv"), datapath)
+            countriesdatafiles = partition_datafiles(
+                {"NATMON": (metadatapath, datapath), "DEM": (None, datapath)}
+            )
+            assert list(countriesdatafiles.keys()) == ["AFG"]
+            metadatafile, datafile = countriesdatafiles["AFG"]["NATMON"]
+            years = [str(year) for year in range(1970, 2021)]
+            with open(datapath, "rb") as f:
+                data = f.read()
+            assert datafile == {
+                "path": datapath,
+                "headers": TestUNESCO.dataheaders,
+                "ranges": [[55, 258640]],
+                "years": years,
+                "digest": sha256(data[55:]).hexdigest(),
+            }
+            assert metadatafile["ranges"] == [[43, 109973]]
+            assert countriesdatafiles["AFG"]["DEM"] == (None, datafile)
+            assert (
+                partition_datafiles(
+                    {"NATMON": (metadatapath, datapath)}, countryisos={"ALB"}
+                )
+                == dict()
+            )
+            assert "qcranges" not in datafile
+            with open(datapath, newline="") as f:
+                assert list(
+                    get_rows(datapath, datafile["headers"], datafile["ranges"])
+                ) == list(DictReader(f))
+            countriesdatafiles = partition_datafiles(
+                {"NATMON": (metadatapath, datapath)},
+                {"NATMON": {"quickcharts": [{"code": "GER.1t3"}, {"code": "CR.1"}]}},
+            )
+            _, datafile = countriesdatafiles["AFG"]["NATMON"]
+            assert datafile["qcranges"] == [[82383, 83489]]
+            qcrows = list(get_rows(datapath, datafile["headers"], datafile["qcranges"]))
+            metadatarows = list(
+                get_rows(metadatapath, metadatafile["headers"], metadatafile["ranges"])
+            )
+            metadatapath = compact_datafile(metadatapath)
+            datapath = compact_datafile(datapath)
+            assert not exists(metadatapath[:-2])
+            assert not exists(datapath[:-2])
+            countriesdatafiles = partition_datafiles(
+                {"NATMON": (metadatapath, datapath)},
+                {"NATMON": {"quickcharts": [{"code": "GER.1t3"}, {"code": "CR.1"}]}},
+            )
+            metadatafile, datafile = countriesdatafiles["AFG"]["NATMON"]
+            assert datafile["path"] == datapath
+            assert datafile["digest"] == sha256(data[55:]).hexdigest()
+            assert datafile["years"] == years
+            rows = get_rows(
+                metadatapath,
+                metadatafile["headers"],
+                metadatafile["ranges"],
+                blob=metadatafile["blob"],
+            )
+            assert list(rows) == metadatarows
+            assert get_bytes_read(countriesdatafiles["AFG"]) < len(data)
+            rows = get_rows(
+                datafile["path"],
+                datafile["headers"],
+                datafile["qcranges"],
+                blob=datafile["blob"],
+            )
+            assert list(rows) == qcrows
+            with open(join("tests", "fixtures", "NATMON_DATA_NATIONAL.csv")) as f:
+                rows = get_rows(
+                    datafile["path"],
+                    datafile["headers"],
+                    datafile["ranges"],
+                    blob=datafile["blob"],
+                )
+                assert list(rows) == list(DictReader(f))
+
+    def test_generate_country_resource(self, configuration):
+        configuration = Configuration.read()
+        indicatorsetcodes = {"NATMON": configuration["indicatorsetcodes"]["NATMON"]}
+        quickcharts = {
+            "hashtag": "#indicator+code",
+            "values": [x["code"] for x in indicatorsetcodes["NATMON"]["quickcharts"]],
+            "numeric_hashtag": "#indicator+value+num",
+            "cutdown": 2,
+            "cutdownhashtags": ["#indicator+code", "#country+code", "#date+year"],
+        }
+        with temp_dir("TestUNESCO") as folder:
+            datapath = join(folder, "NATMON_DATA_NATIONAL.csv")
+            copyfile(join("tests", "fixtures", "NATMON_DATA_NATIONAL.csv"), datapath)
+            datafiles = {"NATMON": (None, datapath)}
+            for codes in (indicatorsetcodes, None):
+                # with and without the quickcharts indicators' rows precomputed
+                _, datafile = partition_datafiles(datafiles, codes)["AFG"]["NATMON"]
+                dataset = Dataset({"name": "unesco-data-for-afghanistan"})
+                outputfolder = join(folder, str(codes is None))
+                rows, bites_disabled = generate_country_resource(
+                    dataset,
+                    datafile,
+                    outputfolder,
+                    "NATMON_data_AFG.csv",
+                    {"name": "National Monitoring data"},
+                    quickcharts,
                 )
-                assert indicatorsetsdates == {"NATMON": "2020 September"}
-                assert datafiles == {
-                    "NATMON": (
-                        join(
-                            os.sep, "tmp", "TestUNESCO", "NATMON", "NATMON_METADATA.csv"
-                        ),
-                        join(
-                            os.sep,
-                            "tmp",
-                            "TestUNESCO",
-                            "NATMON",
-                            "NATMON_DATA_NATIONAL.csv",
-                        ),
+                assert rows == 9390
+                assert bites_disabled == [False, False, False]
+                assert dataset.number_of_resources() == 2
+                for filename in ("NATMON_data_AFG.csv", "qc_NATMON_data_AFG.csv"):
+                    assert_files_same(
+                        join("tests", "fixtures", filename),
+                        join(outputfolder, filename),
                     )
-                }
+
+    def test_get_year_range(self):
+        startdate, enddate = get_year_range("2019")
+        assert startdate.isoformat() == "2019-01-01T00:00:00+00:00"
+        assert enddate.isoformat() == "2019-12-31T23:59:59+00:00"
+        hits = get_year_range.cache_info().hits
+        assert get_year_range("2019") == (startdate, enddate)
+        assert get_year_range.cache_info().hits == hits + 1
 
     def test_generate_dataset_and_showcase(self, configuration):
         configuration = Configuration.read()
         indicatorsetcodes = {"NATMON": configuration["indicatorsetcodes"]["NATMON"]}
         with temp_dir("TestUNESCO", delete_on_failure=False) as folder:
-            with Download(user_agent="test") as downloader:
-                country = {"iso3": "AFG", "iso2": "AF", "countryname": "Afghanistan"}
-                indicators = [
+            country = {"iso3": "AFG", "iso2": "AF", "countryname": "Afghanistan"}
+            indicators = [
+                {
+                    "indicator_id": "GER.1t3",
+                    "indicator_label_en": "Gross enrolment ratio, primary and secondary, both sexes (number)",
+                },
+                {
+                    "indicator_id": "XGDP.1.FSgov",
+                    "indicator_label_en": "Government expenditure on primary education, both sexes (number)",
+                },
+                {
+                    "indicator_id": "XGDP.2.FSgov",
+                    "indicator_label_en": "Government expenditure on lower secondary education, both sexes (number)",
+                },
+            ]
+            shortnames = {
+                "Gross enrolment ratio, primary and secondary",
+                "Government expenditure on primary education",
+                "Government expenditure on lower secondary education",
+            }
+            indicatorsetsindicators = {
+                "NATMON": {"rows": indicators, "shortnames": shortnames}
+            }
+            paths = list()
+            for filename in ("NATMON_METADATA.csv", "NATMON_DATA_NATIONAL.csv"):
+                path = join(folder, filename)
+                copyfile(join("tests", "fixtures", filename), path)
+                paths.append(path)
+            datafiles = partition_datafiles(
+                {"NATMON": tuple(paths)}, indicatorsetcodes
+            )["AFG"]
+            (
+                dataset,
+                showcase,
+                bites_disabled,
+                qc_indicators,
+            ) = generate_dataset_and_showcase(
+                indicatorsetcodes,
+                TestUNESCO.indheaders,
+                indicatorsetsindicators,
+                {"NATMON": "2020 September"},
+                country,
+                datafiles,
+                folder,
+            )
+            assert dataset == {
+                "name": "unesco-data-for-afghanistan",
+                "title": "Afghanistan - Education Indicators",
+                "maintainer": "a5c5296a-3206-4e51-b2de-bfe34857185f",
+                "owner_org": "18f2d467-dcf8-4b7e-bffa-b3c338ba3a7c",
+                "data_update_frequency": "-1",
+                "subnational": "0",
+                "groups": [{"name": "afg"}],
+                "tags": [
                     {
-                        "indicator_id": "GER.1t3",
-                        "indicator_label_en": "Gross enrolment ratio, primary and secondary, both sexes (number)",
+                        "name": "sustainable development",
+                        "vocabulary_id": "4e61d464-4943-4e97-973a-84673c1aaa87",
                     },
                     {
-                        "indicator_id": "XGDP.1.FSgov",
-                        "indicator_label_en": "Government expenditure on primary education, both sexes (number)",
+                        "name": "demographics",
+                        "vocabulary_id": "4e61d464-4943-4e97-973a-84673c1aaa87",
                     },
                     {
-                        "indicator_id": "XGDP.2.FSgov",
-                        "indicator_label_en": "Government expenditure on lower secondary education, both sexes (number)",
+                        "name": "socioeconomics",
+                        "vocabulary_id": "4e61d464-4943-4e97-973a-84673c1aaa87",
                     },
-                ]
-                shortnames = {
-                    "Gross enrolment ratio, primary and secondary",
-                    "Government expenditure on primary education",
-                    "Government expenditure on lower secondary education",
-                }
-                indicatorsetsindicators = {
-                    "NATMON": {"rows": indicators, "shortnames": shortnames}
-                }
-                datafiles = {
-                    "NATMON": (
-                        join("tests", "fixtures", "NATMON_METADATA.csv"),
-                        join("tests", "fixtures", "NATMON_DATA_NATIONAL.csv"),
-                    )
-                }
-                (
-                    dataset,
-                    showcase,
-                    bites_disabled,
-                    qc_indicators,
-                ) = generate_dataset_and_showcase(
-                    indicatorsetcodes,
-                    TestUNESCO.indheaders,
-                    indicatorsetsindicators,
-                    {"NATMON": "2020 September"},
-                    country,
-                    datafiles,
-                    downloader,
-                    folder,
-                )
-                assert dataset == {
-                    "name": "unesco-data-for-afghanistan",
-                    "title": "Afghanistan - Education Indicators",
-                    "maintainer": "a5c5296a-3206-4e51-b2de-bfe34857185f",
-                    "owner_org": "18f2d467-dcf8-4b7e-bffa-b3c338ba3a7c",
-                    "data_update_frequency": "-1",
-                    "subnational": "0",
-                    "groups": [{"name": "afg"}],
-                    "tags": [
-                        {
-                            "name": "sustainable development",
-                            "vocabulary_id": "4e61d464-4943-4e97-973a-84673c1aaa87",
-                        },
-                        {
-                            "name": "demographics",
-                            "vocabulary_id": "4e61d464-4943-4e97-973a-84673c1aaa87",
-                        },
-                        {
-                            "name": "socioeconomics",
-                            "vocabulary_id": "4e61d464-4943-4e97-973a-84673c1aaa87",
-                        },
-                        {
-                            "name": "education",
-                            "vocabulary_id": "4e61d464-4943-4e97-973a-84673c1aaa87",
-                        },
-                        {
-                            "name": "indicators",
-                            "vocabulary_id": "4e61d464-4943-4e97-973a-84673c1aaa87",
-                        },
-                        {
-                            "name": "sustainable development goals-sdg",
-                            "vocabulary_id": "4e61d464-4943-4e97-973a-84673c1aaa87",
-                        },
-                        {
-                            "name": "hxl",
-                            "vocabulary_id": "4e61d464-4943-4e97-973a-84673c1aaa87",
-                        },
-                    ],
-                    "dataset_date": "[1970-01-01T00:00:00 TO 2020-12-31T23:59:59]",
-                    "notes": "Education indicators for Afghanistan.\n\nContains data from the UNESCO Institute for Statistics [bulk data service](http://data.uis.unesco.org) covering the following categories: National Monitoring (made 2020 September)",
-                }
-
-                resources = dataset.get_resources()
-                assert resources == [
                     {
-                        "name": "National Monitoring data",
-                        "description": "National Monitoring data with HXL tags.\n\nIndicators: Government expenditure on lower secondary education, Government expenditure on primary education, Gross enrolment ratio, primary and secondary",
-                        "format": "csv",
+                        "name": "education",
+                        "vocabulary_id": "4e61d464-4943-4e97-973a-84673c1aaa87",
                     },
                     {
-                        "name": "National Monitoring indicator list",
-                        "description": "National Monitoring indicator list with HXL tags",
-                        "format": "csv",
+                        "name": "indicators",
+                        "vocabulary_id": "4e61d464-4943-4e97-973a-84673c1aaa87",
                     },
                     {
-                        "name": "National Monitoring metadata",
-                        "description": "National Monitoring metadata with HXL tags",
-                        "format": "csv",
+                        "name": "sustainable development goals-sdg",
+                        "vocabulary_id": "4e61d464-4943-4e97-973a-84673c1aaa87",
                     },
                     {
-                        "name": "QuickCharts-National Monitoring data",
-                        "description": "Cut down data for QuickCharts",
-                        "format": "csv",
+                        "name": "hxl",
+                        "vocabulary_id": "4e61d464-4943-4e97-973a-84673c1aaa87",
                     },
-                ]
+                ],
+                "dataset_date": "[1970-01-01T00:00:00 TO 2020-12-31T23:59:59]",
+                "notes": "Education indicators for Afghanistan.\n\nContains data from the UNESCO Institute for Statistics [bulk data service](http://data.uis.unesco.org) covering the following categories: National Monitoring (made 2020 September)",
+            }
 
-                assert showcase == {
-                    "name": "unesco-data-for-afghanistan-showcase",
-                    "title": "Afghanistan - Education Indicators",
-                    "notes": "Education indicators for Afghanistan",
-                    "url": "https://uis.unesco.org/en/country/AF",
-                    "image_url": "https://tcg.uis.unesco.org/wp-content/uploads/sites/4/2021/09/combined_uis_colors_eng-002-300x240.png",
-                    "tags": [
-                        {
-                            "name": "sustainable development",
-                            "vocabulary_id": "4e61d464-4943-4e97-973a-84673c1aaa87",
-                        },
-                        {
-                            "name": "demographics",
-                            "vocabulary_id": "4e61d464-4943-4e97-973a-84673c1aaa87",
-                        },
-                        {
-                            "name": "socioeconomics",
-                            "vocabulary_id": "4e61d464-4943-4e97-973a-84673c1aaa87",
-                        },
-                        {
-                            "name": "education",
-                            "vocabulary_id": "4e61d464-4943-4e97-973a-84673c1aaa87",
-                        },
-                        {
-                            "name": "indicators",
-                            "vocabulary_id": "4e61d464-4943-4e97-973a-84673c1aaa87",
-                        },
-                        {
-                            "name": "sustainable development goals-sdg",
-                            "vocabulary_id": "4e61d464-4943-4e97-973a-84673c1aaa87",
-                        },
-                        {
-                            "name": "hxl",
-                            "vocabulary_id": "4e61d464-4943-4e97-973a-84673c1aaa87",
-                        },
-                    ],
-                }
+            resources = dataset.get_resources()
+            assert resources == [
+                {
+                    "name": "National Monitoring data",
+                    "description": "National Monitoring data with HXL tags.\n\nIndicators: Government expenditure on lower secondary education, Government expenditure on primary education, Gross enrolment ratio, primary and secondary",
+                    "format": "csv",
+                },
+                {
+                    "name": "National Monitoring indicator list",
+                    "description": "National Monitoring indicator list with HXL tags",
+                    "format": "csv",
+                },
+                {
+                    "name": "National Monitoring metadata",
+                    "description": "National Monitoring metadata with HXL tags",
+                    "format": "csv",
+                },
+                {
+                    "name": "QuickCharts-National Monitoring data",
+                    "description": "Cut down data for QuickCharts",
+                    "format": "csv",
+                },
+            ]
 
-                assert bites_disabled == [False, False, False]
-                assert qc_indicators == [
+            assert showcase == {
+                "name": "unesco-data-for-afghanistan-showcase",
+                "title": "Afghanistan - Education Indicators",
+                "notes": "Education indicators for Afghanistan",
+                "url": "https://uis.unesco.org/en/country/AF",
+                "image_url": "https://tcg.uis.unesco.org/wp-content/uploads/sites/4/2021/09/combined_uis_colors_eng-002-300x240.png",
+                "tags": [
                     {
-                        "code": "GER.1t3",
-                        "title": "Gross enrolment ratio, primary and secondary",
-                        "unit": "Percentage (%)",
+                        "name": "sustainable development",
+                        "vocabulary_id": "4e61d464-4943-4e97-973a-84673c1aaa87",
                     },
                     {
-                        "code": "XGDP.1.FSgov",
-                        "title": "Government expenditure on primary education",
-                        "unit": "Percentage of GDP (%)",
+                        "name": "demographics",
+                        "vocabulary_id": "4e61d464-4943-4e97-973a-84673c1aaa87",
                     },
                     {
-                        "code": "XGDP.2.FSgov",
-                        "title": "Government expenditure on lower secondary education",
-                        "unit": "Percentage of GDP (%)",
+                        "name": "socioeconomics",
+                        "vocabulary_id": "4e61d464-4943-4e97-973a-84673c1aaa87",
                     },
-                ]
-                file = "NATMON_data_AFG.csv"
-                assert_files_same(
-                    join("tests", "fixtures", file), join(folder, "NATMON", file)
-                )
-                file = "qc_NATMON_data_AFG.csv"
-                assert_files_same(
-                    join("tests", "fixtures", file), join(folder, "NATMON", file)
-                )
-                file = "NATMON_indicatorlist_AFG.csv"
-                assert_files_same(
-                    join("tests", "fixtures", file), join(folder, "NATMON", file)
-                )
-                file = "NATMON_metadata_AFG.csv"
-                assert_files_same(
-                    join("tests", "fixtures", file), join(folder, "NATMON", file)
-                )
+                    {
+                        "name": "education",
+                        "vocabulary_id": "4e61d464-4943-4e97-973a-84673c1aaa87",
+                    },
+                    {
+                        "name": "indicators",
+                        "vocabulary_id": "4e61d464-4943-4e97-973a-84673c1aaa87",
+                    },
+                    {
+                        "name": "sustainable development goals-sdg",
+                        "vocabulary_id": "4e61d464-4943-4e97-973a-84673c1aaa87",
+                    },
+                    {
+                        "name": "hxl",
+                        "vocabulary_id": "4e61d464-4943-4e97-973a-84673c1aaa87",
+                    },
+                ],
+            }
+
+            assert bites_disabled == [False, False, False]
+            assert qc_indicators == [
+                {
+                    "code": "GER.1t3",
+                    "title": "Gross enrolment ratio, primary and secondary",
+                    "unit": "Percentage (%)",
+                },
+                {
+                    "code": "XGDP.1.FSgov",
+                    "title": "Government expenditure on primary education",
+                    "unit": "Percentage of GDP (%)",
+                },
+                {
+                    "code": "XGDP.2.FSgov",
+                    "title": "Government expenditure on lower secondary education",
+                    "unit": "Percentage of GDP (%)",
+                },
+            ]
+            file = "NATMON_data_AFG.csv"
+            assert_files_same(
+                join("tests", "fixtures", file), join(folder, "NATMON", file)
+            )
+            file = "qc_NATMON_data_AFG.csv"
+            assert_files_same(
+                join("tests", "fixtures", file), join(folder, "NATMON", file)
+            )
+            file = "NATMON_indicatorlist_AFG.csv"
+            assert_files_same(
+                join("tests", "fixtures", file), join(folder, "NATMON", file)
+            )
+            file = "NATMON_metadata_AFG.csv"
+            assert_files_same(
+                join("tests", "fixtures", file), join(folder, "NATMON", file)
+            )
+
+    def test_generate_payload(self, configuration):
+        configuration = Configuration.read()
+        indicatorsetcodes = {"NATMON": configuration["indicatorsetcodes"]["NATMON"]}
+        indicatorsets = {"NATMON": join("tests", "fixtures", "NATMON.zip")}
+        countries = [
+            {"iso3": "AFG", "iso2": "AF", "countryname": "Afghanistan"},
+            {"iso3": "ALB", "iso2": "AL", "countryname": "Albania"},
+        ]
+        with temp_dir("TestUNESCO") as folder:
+            _, indheaders, indicatorsetsindicators, indicatorsetsdates, datafiles, _ = (
+                get_countriesdata(indicatorsets, folder)
+            )
+            countriesdatafiles = partition_datafiles(datafiles, indicatorsetcodes)
+            pairdigests = get_pair_digests(
+                indicatorsetcodes,
+                indicatorsetsindicators,
+                indicatorsetsdates,
+                countriesdatafiles,
+            )
+            arguments = {
+                "indicatorsetcodes": indicatorsetcodes,
+                "indheaders": indheaders,
+                "indicatorsetsindicators": indicatorsetsindicators,
+                "indicatorsetsdates": indicatorsetsdates,
+                "countriesdatafiles": countriesdatafiles,
+                "pairdigests": pairdigests,
+                "releases": dict(),
+            }
+            executor = get_executor(arguments, 2)
+            try:
+                futures = submit_countries(executor, countries, folder)
+                payloads = {iso3: future.result() for iso3, future in futures.items()}
+            finally:
+                executor.shutdown()
+            metrics = payloads["AFG"].pop("metrics")
+            assert metrics["stage"] == "generate"
+            assert metrics["country"] == "AFG"
+            assert metrics["rows_kept"] == 9390 + 645
+            assert metrics["bytes_read"] == 258585 + 109930
+            release = payloads["AFG"].pop("release")
+            assert release["NATMON"]["digest"] == pairdigests["AFG"]["NATMON"]
+            assert [x[1] for x in release["NATMON"]["resources"]] == [
+                "NATMON_data_AFG.csv",
+                "NATMON_indicatorlist_AFG.csv",
+                "NATMON_metadata_AFG.csv",
+                "qc_NATMON_data_AFG.csv",
+            ]
+            assert release["NATMON"]["bites_disabled"] == [False, False, False]
+            assert payloads["ALB"].pop("metrics")["rows_kept"] == 0
+            assert payloads["ALB"].pop("release") == dict()
+            assert payloads["ALB"] == {"iso3": "ALB", "dataset": None}
+            assert get_executor(arguments, 1) is None
+            payload = generate_payload(countries[0], folder)
+            assert payload.pop("metrics")["bytes_written"] == metrics["bytes_written"]
+            assert payload.pop("release") == release
+            assert payload == payloads["AFG"]
+            # unchanged in the release so the previous resources are reused
+            arguments["releases"] = {"AFG": release}
+            get_executor(arguments, 1)
+            payload = generate_payload(countries[0], folder)
+            assert payload.pop("metrics")["rows_kept"] == 0
+            assert payload.pop("release") == release
+            assert payload == payloads["AFG"]
+            dataset, showcase, bites_disabled, qc_indicators = load_payload(
+                payloads["AFG"]
+            )
+            assert dataset["name"] == "unesco-data-for-afghanistan"
+            assert (
+                dataset["dataset_date"]
+                == "[1970-01-01T00:00:00 TO 2020-12-31T23:59:59]"
+            )
+            assert [resource["name"] for resource in dataset.get_resources()] == [
+                "National Monitoring data",
+                "National Monitoring indicator list",
+                "National Monitoring metadata",
+                "QuickCharts-National Monitoring data",
+            ]
+            assert dataset.get_resource(0).get_file_to_upload() == join(
+                folder, "NATMON", "NATMON_data_AFG.csv"
+            )
+            assert showcase["name"] == "unesco-data-for-afghanistan-showcase"
+            assert bites_disabled == [False, False, False]
+            assert qc_indicators == indicatorsetcodes["NATMON"]["quickcharts"]
+            assert load_payload(payloads["ALB"]) == (None, None, None, None)
+            assert samefile(
+                dataset.get_resource(1).get_file_to_upload(),
+                indicatorsetsindicators["NATMON"]["path"],
+            )
+            file = "qc_NATMON_data_AFG.csv"
+            assert_files_same(
+                join("tests", "fixtures", file), join(folder, "NATMON", file)
+            )
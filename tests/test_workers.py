@@ -0,0 +1,96 @@
+#!/usr/bin/python
+"""
+Unit tests for the upload queue.
+
+"""
+
+import warnings
+from multiprocessing import active_children
+from threading import Event, Thread
+from time import sleep
+
+import pytest
+
+from hdx.scraper.unesco.workers import (
+    UploadQueue,
+    get_executor,
+    is_ready,
+    submit_countries,
+)
+
+
+class TestWorkers:
+    def test_submit_countries_limit(self):
+        class Executor:
+            @staticmethod
+            def submit(function, country, folder):
+                return country["iso3"]
+
+        countries = iter([{"iso3": "AFG"}, {"iso3": "ALB"}, {"iso3": "DZA"}])
+        futures = submit_countries(Executor(), countries, "folder", limit=2)
+        assert list(futures.keys()) == ["AFG", "ALB"]
+        futures.pop("AFG")
+        submit_countries(Executor(), countries, "folder", futures, 2)
+        assert list(futures.keys()) == ["ALB", "DZA"]
+        submit_countries(Executor(), countries, "folder", futures, 2)
+        assert list(futures.keys()) == ["ALB", "DZA"]
+
+    def test_get_executor(self):
+        executor = get_executor(dict(), 2)
+        # forked before any upload threads are started
+        assert len(active_children()) == 2
+        release = Event()
+        thread = Thread(target=release.wait)
+        thread.start()
+        try:
+            with warnings.catch_warnings():
+                # raised from Python 3.12 by forking once there are other threads
+                warnings.simplefilter("error", DeprecationWarning)
+                futures = [executor.submit(is_ready) for _ in range(4)]
+                assert all(future.result() for future in futures)
+        finally:
+            release.set()
+            thread.join()
+            executor.shutdown()
+
+    def test_upload_queue(self):
+        uploaded = list()
+
+        def upload(countryiso, value):
+            sleep(0.01)
+            uploaded.append((countryiso, value))
+
+        uploadqueue = UploadQueue(upload, 3)
+        for i, countryiso in enumerate(("AFG", "ALB", "DZA", "AND", "AGO")):
+            assert uploadqueue.put(countryiso, i) is True
+        uploadqueue.close()
+        assert sorted(uploaded) == [
+            ("AFG", 0),
+            ("AGO", 4),
+            ("ALB", 1),
+            ("AND", 3),
+            ("DZA", 2),
+        ]
+        assert uploadqueue.pending == []
+
+    def test_upload_queue_failure(self):
+        uploaded = list()
+        release = Event()
+
+        def upload(countryiso):
+            if countryiso == "ALB":
+                raise ValueError("HDX is down!")
+            if countryiso == "AFG":
+                release.wait()
+            uploaded.append(countryiso)
+
+        uploadqueue = UploadQueue(upload, 2, maxsize=1)
+        assert uploadqueue.put("AFG") is True
+        assert uploadqueue.put("ALB") is True
+        uploadqueue.failed.wait()
+        assert uploadqueue.put("DZA") is False
+        release.set()
+        with pytest.raises(ValueError):
+            uploadqueue.close()
+        assert uploaded == ["AFG"]
+        assert uploadqueue.pending == ["ALB", "DZA"]